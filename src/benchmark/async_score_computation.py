@@ -0,0 +1,200 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from src.benchmark.pdb_normalization import normalize_dataset
+from src.benchmark.score_computation import ScoreComputation
+
+# Bytes of the docker output read at once
+CHUNK_SIZE = 65536
+
+
+class AsyncScoreComputation(ScoreComputation):
+    def __init__(self, *args, n_jobs: int = 2, refresh: float = 1.0, **kwargs):
+        """
+        Run the scoring of the challenges concurrently with asyncio.
+        :param n_jobs: maximum number of containers running at the same time
+        :param refresh: seconds between two refreshes of the progress summary
+        """
+        super().__init__(*args, **kwargs)
+        self.n_jobs = n_jobs
+        self.refresh = refresh
+        self.status: Dict[str, str] = {}
+        self.durations: List[float] = []
+        self.start_time: Optional[float] = None
+        # Docker clients of the running jobs, by container name
+        self.containers: Dict[str, asyncio.subprocess.Process] = {}
+
+    def run_benchmark(self):
+        """
+        Compute scores for all the predictions, with at most `n_jobs` containers
+        running at the same time.
+        """
+        try:
+            asyncio.run(self.run_benchmark_async())
+        except KeyboardInterrupt:
+            if self.containers:
+                # The event loop was closed before the containers were removed
+                self._remove_containers_sync(list(self.containers))
+            print(
+                "\nInterrupted: running containers have been stopped.", file=sys.stderr
+            )
+
+    async def run_benchmark_async(self):
+        os.makedirs(self.output_path, exist_ok=True)
+        os.makedirs(self.time_path, exist_ok=True)
+        os.makedirs(self.log_path, exist_ok=True)
+        challenges = self.get_challenges()
+        self.status = {paths[1]: "pending" for paths in challenges}
+        self.durations, self.start_time = [], time.monotonic()
+        semaphore = asyncio.Semaphore(self.n_jobs)
+        progress = asyncio.create_task(self._show_progress())
+        tasks = [
+            asyncio.create_task(self._compute_challenge(semaphore, *paths))
+            for paths in challenges
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            progress.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Stopped here, in the main task: the jobs are already cancelled and
+            # an await in their own cleanup would be cancelled again on exit
+            await self._stop_all()
+            self._print_progress(end="\n")
+
+    async def _compute_challenge(self, semaphore: asyncio.Semaphore, *paths: str):
+        async with semaphore:
+            try:
+                await self.compute_challenge_async(*paths)
+            except Exception as e:
+                # Only this challenge fails, the other ones keep running
+                self.status[paths[1]] = "failed"
+                print(f"\n{paths[1]}: {e!r}", file=sys.stderr)
+
+    async def compute_challenge_async(
+        self,
+        native_path: str,
+        pred_path: str,
+        output_path: str,
+        log_path: str,
+        time_path: str,
+    ):
+        """
+        Run the docker command for one challenge, streaming its stdout/stderr
+        to `<challenge>_docker.log` in the log folder while it runs.
+        """
+        challenge = os.path.basename(os.path.normpath(pred_path))
+        name = f"rnadvisor_{challenge}_{os.getpid()}"
+        command = self.get_command(
+            native_path, pred_path, output_path, log_path, time_path, name=name
+        )
+        stream_path = log_path.replace(".log", "_docker.log")
+        self.status[pred_path] = "running"
+        start = time.monotonic()
+        with open(stream_path, "wb") as log_file:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            self.containers[name] = process
+            try:
+                assert process.stdout is not None
+                # Read by chunks: a progress bar redrawn with "\r" has no newline
+                # and would go past the size limit of a line
+                while chunk := await process.stdout.read(CHUNK_SIZE):
+                    log_file.write(chunk)
+                    log_file.flush()
+                return_code = await process.wait()
+            except asyncio.CancelledError:
+                # The container is removed by _stop_all, once all jobs are cancelled
+                self.status[pred_path] = "cancelled"
+                raise
+            except Exception:
+                await self._stop_containers([name])
+                raise
+            del self.containers[name]
+        self.durations.append(time.monotonic() - start)
+        self.status[pred_path] = "done" if return_code == 0 else "failed"
+
+    async def _stop_all(self):
+        """
+        Stop the containers and the docker clients of the cancelled jobs.
+        Killing the clients alone would leave the containers running.
+        """
+        await self._stop_containers(list(self.containers))
+
+    async def _stop_containers(self, names: List[str]):
+        # Removed from the dict first: the other jobs may finish while we wait
+        processes = [self.containers.pop(name) for name in names]
+        if not processes:
+            return
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+        for process in processes:
+            await process.wait()
+        try:
+            killer = await asyncio.create_subprocess_exec(
+                "docker",
+                "rm",
+                "-f",
+                *names,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            await killer.wait()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove_containers_sync(names: List[str]):
+        try:
+            subprocess.run(
+                ["docker", "rm", "-f", *names],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            pass
+
+    async def _show_progress(self):
+        while True:
+            self._print_progress()
+            await asyncio.sleep(self.refresh)
+
+    def _print_progress(self, end: str = "\r"):
+        counts = {status: 0 for status in ["pending", "running", "done", "failed"]}
+        for status in self.status.values():
+            counts[status] = counts.get(status, 0) + 1
+        finished = counts["done"] + counts["failed"]
+        eta = "?"
+        if self.durations and self.start_time is not None:
+            elapsed = time.monotonic() - self.start_time
+            remaining = len(self.status) - finished
+            eta = f"{elapsed / finished * remaining:.0f}s"
+        print(
+            f"[{finished}/{len(self.status)}] done: {counts['done']} "
+            f"running: {counts['running']} failed: {counts['failed']} ETA: {eta}",
+            end=end,
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    # To compute challenge for all the benchmarks
+    prefix = os.path.join("docker_data", "input")
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        NATIVE_PATHS, PREDS_PATHS = normalize_dataset(dataset, prefix, n_jobs=4)
+        OUTPUT_PATH = os.path.join(prefix.replace("input", "output"), dataset)
+        score_computation = AsyncScoreComputation(
+            NATIVE_PATHS, PREDS_PATHS, OUTPUT_PATH, n_jobs=4
+        )
+        score_computation.run_benchmark()
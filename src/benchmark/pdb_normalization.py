@@ -0,0 +1,311 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Change it when the normalization changes, to normalize again all the files
+NORMALIZATION_VERSION = "1"
+NUCLEOTIDES = "ACGU"
+# Scores of the alignment of the predicted and native sequences
+MATCH, MISMATCH, GAP = 2, -1, -2
+
+# A residue: chain, number, insertion code and name
+Residue = Tuple[str, int, str, str]
+
+
+def read_atoms(pdb_path: str) -> List[Tuple[Residue, str]]:
+    """
+    Read the ATOM records of the first model of a .pdb file, without the
+    hydrogens and the heteroatoms (HETATM records are skipped).
+    :return: list of (residue, line) in the order of the file
+    """
+    atoms = []
+    with open(pdb_path) as file:
+        for line in file:
+            if line.startswith("ENDMDL"):
+                break
+            if not line.startswith("ATOM"):
+                continue
+            line = line.rstrip("\n").ljust(80)
+            # Without the element column, the element starts the atom name
+            name = line[12:16].strip().lstrip("0123456789")
+            element = line[76:78].strip() or name[:1]
+            if element.upper() in ["H", "D"]:
+                continue
+            residue = (line[21], int(line[22:26]), line[26], line[17:20].strip())
+            atoms.append((residue, line))
+    return atoms
+
+
+def get_residues(atoms: List[Tuple[Residue, str]]) -> List[Residue]:
+    return list(dict.fromkeys(residue for residue, _ in atoms))
+
+
+def get_sequence(residues: List[Residue]) -> str:
+    """
+    Return the sequence of the residues (N for the unknown nucleotides).
+    Example: "G", "RG" or "GTP" -> G
+    """
+    return "".join(
+        name[-1] if name[-1] in NUCLEOTIDES else "N"
+        for _, _, _, name in residues
+    )
+
+
+def align(seq_1: str, seq_2: str) -> List[Tuple[int, int]]:
+    """
+    Global alignment (Needleman-Wunsch) of two sequences.
+    Each row of the score matrix is computed at once: the gaps along the row
+    are taken into account with a cumulative maximum.
+    :return: the pairs of aligned indices (i in seq_1, j in seq_2)
+    """
+    codes_1 = np.frombuffer(seq_1.encode(), dtype=np.uint8)
+    codes_2 = np.frombuffer(seq_2.encode(), dtype=np.uint8)
+    n_1, n_2 = len(codes_1), len(codes_2)
+    columns = np.arange(n_2 + 1)
+    scores = np.zeros((n_1 + 1, n_2 + 1))
+    scores[0] = GAP * columns
+    for i in range(1, n_1 + 1):
+        similarity = np.where(codes_2 == codes_1[i - 1], MATCH, MISMATCH)
+        candidates = np.empty(n_2 + 1)
+        candidates[0] = GAP * i
+        candidates[1:] = np.maximum(
+            scores[i - 1, :-1] + similarity, scores[i - 1, 1:] + GAP
+        )
+        # Gap in seq_1: scores[i, j] >= scores[i, k] + GAP * (j - k)
+        scores[i] = (
+            np.maximum.accumulate(candidates - GAP * columns) + GAP * columns
+        )
+    pairs = []
+    i, j = n_1, n_2
+    while i > 0 and j > 0:
+        match = MATCH if codes_1[i - 1] == codes_2[j - 1] else MISMATCH
+        if scores[i, j] == scores[i - 1, j - 1] + match:
+            pairs.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif scores[i, j] == scores[i - 1, j] + GAP:
+            i -= 1
+        else:
+            j -= 1
+    return pairs[::-1]
+
+
+def format_atoms(atoms: List[Tuple[Residue, str]]) -> str:
+    """
+    Write the atoms as .pdb lines, numbered from 1, with a TER at each chain end.
+    """
+    lines, serial = [], 1
+    for index, ((chain, number, icode, name), line) in enumerate(atoms):
+        lines.append(
+            f"ATOM  {serial:5d} {line[12:16]}{line[16]}{name:>3} {chain}"
+            f"{number:4d}{icode}{line[27:]}".rstrip()
+        )
+        serial += 1
+        is_last = index == len(atoms) - 1 or atoms[index + 1][0][0] != chain
+        if is_last:
+            lines.append(
+                f"TER   {serial:5d}      {name:>3} {chain}{number:4d}{icode}"
+            )
+            serial += 1
+    return "\n".join(lines + ["END", ""])
+
+
+@lru_cache(maxsize=8)
+def read_native(native_path: str) -> Tuple[List[Residue], str]:
+    """
+    Residues and sequence of a native structure (read once per process).
+    """
+    residues = get_residues(read_atoms(native_path))
+    return residues, get_sequence(residues)
+
+
+def normalize_native(native_path: str) -> str:
+    """
+    Return the native structure without the hydrogens and the heteroatoms.
+    """
+    return format_atoms(read_atoms(native_path))
+
+
+def normalize_prediction(pred_path: str, native_path: str) -> str:
+    """
+    Return the prediction without the hydrogens and the heteroatoms, with the
+    chain IDs and residue numbers of the native.
+    The residues are matched by aligning the sequences of the two structures;
+    the residues of the prediction that are not in the native are removed.
+    """
+    atoms = read_atoms(pred_path)
+    residues = get_residues(atoms)
+    native_residues, native_sequence = read_native(native_path)
+    pairs = align(get_sequence(residues), native_sequence)
+    mapping = {
+        residues[i]: native_residues[j][:3] + (residues[i][3],) for i, j in pairs
+    }
+    return format_atoms(
+        [(mapping[residue], line) for residue, line in atoms if residue in mapping]
+    )
+
+
+def hash_inputs(*paths: str) -> str:
+    digest = hashlib.sha256(NORMALIZATION_VERSION.encode())
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()
+
+
+def normalize_file(in_path: str, native_path: Optional[str], out_path: str) -> str:
+    """
+    Normalize a native (native_path is None) or predicted structure.
+    :return: the output path
+    """
+    if native_path is None:
+        content = normalize_native(in_path)
+    else:
+        content = normalize_prediction(in_path, native_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(content)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class PDBNormalization:
+    def __init__(
+        self, native_paths: str, preds_paths: str, out_path: str, n_jobs: int = 1
+    ):
+        """
+        Normalize the structures before the scoring: remove the hydrogens and
+        the heteroatoms, and give the predictions the chain IDs and residue
+        numbers of their native.
+        The structures are normalized in a process pool, and only when they (or
+        their native) have changed since the last run: the hash of the inputs of
+        each output file is kept in out_path/manifest.json.
+        :param native_paths: folder of the native structures (<challenge>.pdb)
+        :param preds_paths: folder of the predictions (<challenge>/<model>.pdb)
+        :param out_path: folder of the normalized NATIVE and PREDS folders
+        :param n_jobs: number of processes
+        """
+        self.native_paths = native_paths
+        self.preds_paths = preds_paths
+        self.out_path = out_path
+        self.n_jobs = n_jobs
+        self.out_native_paths = os.path.join(out_path, "NATIVE")
+        self.out_preds_paths = os.path.join(out_path, "PREDS")
+        self.manifest_path = os.path.join(out_path, "manifest.json")
+
+    def get_jobs(self) -> Dict[str, Tuple[str, Optional[str], str]]:
+        """
+        Return the structures to normalize.
+        :return: dictionary with the output path and (input path, native path
+            or None for a native, input hash)
+        """
+        jobs = {}
+        for challenge in sorted(os.listdir(self.native_paths)):
+            if not challenge.endswith(".pdb"):
+                continue
+            native_path = os.path.join(self.native_paths, challenge)
+            out_path = os.path.join(self.out_native_paths, challenge)
+            jobs[out_path] = (native_path, None, hash_inputs(native_path))
+            pred_dir = os.path.join(self.preds_paths, challenge.replace(".pdb", ""))
+            if not os.path.isdir(pred_dir):
+                continue
+            for pred in sorted(os.listdir(pred_dir)):
+                if not pred.endswith(".pdb"):
+                    continue
+                pred_path = os.path.join(pred_dir, pred)
+                out_path = os.path.join(
+                    self.out_preds_paths, challenge.replace(".pdb", ""), pred
+                )
+                jobs[out_path] = (
+                    pred_path,
+                    native_path,
+                    hash_inputs(pred_path, native_path),
+                )
+        return jobs
+
+    def read_manifest(self) -> Dict[str, str]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as file:
+            return json.load(file)
+
+    def write_manifest(self, manifest: Dict[str, str]):
+        os.makedirs(self.out_path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def remove_outputs(self, out_paths: Set[str]):
+        """
+        Remove the normalized structures (and the emptied folders) that are not
+        in out_paths.
+        """
+        for root, dirs, files in os.walk(self.out_path, topdown=False):
+            for file in files:
+                path = os.path.join(root, file)
+                if file.endswith(".pdb") and path not in out_paths:
+                    os.remove(path)
+            if root != self.out_path and not os.listdir(root):
+                os.rmdir(root)
+
+    def run(self) -> Tuple[int, int]:
+        """
+        Normalize the new and changed structures.
+        :return: number of normalized structures and of failures
+        """
+        jobs = self.get_jobs()
+        manifest = self.read_manifest()
+        todo = {
+            out_path: job
+            for out_path, job in jobs.items()
+            if manifest.get(out_path) != job[2] or not os.path.exists(out_path)
+        }
+        # Remove the outputs whose input has been removed, not to score them
+        manifest = {x: manifest[x] for x in manifest if x in jobs}
+        self.remove_outputs(set(jobs))
+        n_failed = 0
+        args = [(job[0], job[1], out_path) for out_path, job in todo.items()]
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+            futures = {executor.submit(normalize_file, *arg): arg for arg in args}
+            for future, (in_path, _, out_path) in futures.items():
+                try:
+                    future.result()
+                    manifest[out_path] = todo[out_path][2]
+                except (ValueError, IndexError, OSError) as error:
+                    print(f"Failed to normalize {in_path}: {error}")
+                    n_failed += 1
+                    # The output of the previous version of the input is outdated
+                    manifest.pop(out_path, None)
+                    if os.path.exists(out_path):
+                        os.remove(out_path)
+        self.write_manifest(manifest)
+        return len(todo) - n_failed, n_failed
+
+
+def normalize_dataset(
+    dataset: str, prefix: str = os.path.join("docker_data", "input"), n_jobs: int = 1
+) -> Tuple[str, str]:
+    """
+    Normalize the structures of a dataset.
+    :return: the folders of the normalized natives and predictions
+    """
+    normalization = PDBNormalization(
+        os.path.join(prefix, dataset, "NATIVE"),
+        os.path.join(prefix, dataset, "PREDS"),
+        os.path.join(prefix, dataset, "NORMALIZED"),
+        n_jobs=n_jobs,
+    )
+    n_done, n_failed = normalization.run()
+    print(f"{dataset}: {n_done} structures normalized, {n_failed} failed")
+    return normalization.out_native_paths, normalization.out_preds_paths
+
+
+if __name__ == "__main__":
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        normalize_dataset(dataset, n_jobs=os.cpu_count() or 1)
@@ -1,4 +1,8 @@
 import os
+import shlex
+from typing import List, Optional, Tuple
+
+from src.benchmark.pdb_normalization import normalize_dataset
 
 DOCKER_COMMAND = (
     "docker run -it -v ${PWD}/docker_data/:/app/docker_data "
@@ -17,13 +21,13 @@ class ScoreComputation:
         self.log_path = os.path.join("docker_data", "logs")
         self.time_path = os.path.join("docker_data", "time")
 
-    def run_benchmark(self):
+    def get_challenges(self) -> List[Tuple[str, str, str, str, str]]:
         """
-        Compute scores for all the predictions.
+        Return the paths needed to score each challenge.
+        :return: list of (native_path, pred_path, output_path, log_path, time_path)
         """
-        os.makedirs(self.output_path, exist_ok=True)
-        os.makedirs(self.time_path, exist_ok=True)
-        for challenge in os.listdir(self.native_paths):
+        challenges = []
+        for challenge in sorted(os.listdir(self.native_paths)):
             pred_path = os.path.join(self.preds_paths, challenge.replace(".pdb", ""))
             if os.path.isdir(pred_path):
                 native_path = os.path.join(self.native_paths, challenge)
@@ -36,9 +40,48 @@ class ScoreComputation:
                 time_path = os.path.join(
                     self.time_path, challenge.replace(".pdb", "_time.csv")
                 )
-                self.compute_challenge(
-                    native_path, pred_path, output_path, log_path, time_path
+                challenges.append(
+                    (native_path, pred_path, output_path, log_path, time_path)
                 )
+        return challenges
+
+    def get_command(
+        self,
+        native_path: str,
+        pred_path: str,
+        output_path: str,
+        log_path: str,
+        time_path: str,
+        name: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Return the docker command as a list of arguments.
+        The "-it" flag is removed to allow non-interactive use (cron, nohup).
+        :param name: name given to the container, to be able to kill it
+        :return:
+        """
+        command = (
+            DOCKER_COMMAND.replace("-it ", "")
+            .replace("${PWD}", os.getcwd())
+            .replace("$PRED_PATH", pred_path)
+            .replace("$NATIVE_PATH", native_path)
+            .replace("$OUTPUT_PATH", output_path)
+            .replace("$LOG_PATH", log_path)
+            .replace("$TIME_PATH", time_path)
+        )
+        args = shlex.split(command)
+        if name is not None:
+            args[2:2] = ["--rm", "--name", name]
+        return args
+
+    def run_benchmark(self):
+        """
+        Compute scores for all the predictions.
+        """
+        os.makedirs(self.output_path, exist_ok=True)
+        os.makedirs(self.time_path, exist_ok=True)
+        for challenge_paths in self.get_challenges():
+            self.compute_challenge(*challenge_paths)
 
     def compute_challenge(
         self,
@@ -50,7 +93,7 @@ class ScoreComputation:
     ):
         """
         Run the docker command to compute all the metrics
-        :return:
+        :return: the exit status of the command
         """
         command = (
             DOCKER_COMMAND.replace("$PRED_PATH", pred_path)
@@ -59,15 +102,17 @@ class ScoreComputation:
             .replace("$LOG_PATH", log_path)
             .replace("$TIME_PATH", time_path)
         )
-        os.system(command)
+        return os.system(command)
 
 
 if __name__ == "__main__":
     # To compute challenge for all the benchmarks
     prefix = os.path.join("docker_data", "input")
     for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
-        NATIVE_PATHS = os.path.join(prefix, dataset, "NATIVE")
-        PREDS_PATHS = os.path.join(prefix, dataset, "PREDS")
+        # Score the normalized structures (no hydrogens, numbering of the native)
+        NATIVE_PATHS, PREDS_PATHS = normalize_dataset(
+            dataset, prefix, n_jobs=os.cpu_count() or 1
+        )
         OUTPUT_PATH = os.path.join(prefix.replace("input", "output"), "RNA_PUZZLES")
         score_computation = ScoreComputation(NATIVE_PATHS, PREDS_PATHS, OUTPUT_PATH)
         score_computation.run_benchmark()
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.benchmark.pdb_normalization import normalize_dataset
+from src.benchmark.score_computation import ScoreComputation
+
+STATES = ["pending", "claimed", "done", "failed"]
+
+
+class WorkQueue:
+    def __init__(self, queue_dir: str, timeout: float = 600, heartbeat: float = 30):
+        """
+        Job queue stored on a shared filesystem, without any external broker.
+        Each job is a json file that moves between the `pending`, `claimed`, `done`
+        and `failed` folders. Moves rely on `os.rename`, which is atomic: when
+        several workers try to claim the same job, only one of them succeeds.
+        :param queue_dir: folder of the queue, shared by all the workers
+        :param timeout: seconds without heartbeat before a claimed job is released
+        :param heartbeat: seconds between two heartbeats of a running job
+        """
+        self.queue_dir = queue_dir
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        for state in STATES:
+            os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+    def _path(self, state: str, name: str) -> str:
+        return os.path.join(self.queue_dir, state, name)
+
+    def submit(self, name: str, job: Dict) -> bool:
+        """
+        Add a job to the queue if it is not already known. A failed job is put
+        back in the pending folder, to be run again.
+        :param name: unique name of the job (the challenge)
+        :param job: json serializable arguments of the job
+        :return: whether the job has been added
+        """
+        state = self.get_state(name)
+        if state == "failed":
+            try:
+                os.rename(
+                    self._path("failed", f"{name}.json"),
+                    self._path("pending", f"{name}.json"),
+                )
+            except FileNotFoundError:
+                # Submitted again by another process in the meantime
+                return False
+            return True
+        if state is not None:
+            return False
+        tmp_path = self._path("pending", f".{name}.{socket.gethostname()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.rename(tmp_path, self._path("pending", f"{name}.json"))
+        return True
+
+    def get_state(self, name: str) -> Optional[str]:
+        for state in STATES:
+            for file_name in os.listdir(os.path.join(self.queue_dir, state)):
+                if file_name.split("@")[0] == f"{name}.json":
+                    return state
+        return None
+
+    def claim(self, worker_id: str) -> Optional[str]:
+        """
+        Claim a pending job. The job file is renamed to `claimed/<job>@<worker_id>`.
+        :return: the path of the claimed job file, or None if no job is pending
+        """
+        self.release_stale()
+        for file_name in sorted(os.listdir(os.path.join(self.queue_dir, "pending"))):
+            if not file_name.endswith(".json"):
+                continue
+            claimed_path = self._path("claimed", f"{file_name}@{worker_id}")
+            try:
+                os.rename(self._path("pending", file_name), claimed_path)
+            except FileNotFoundError:
+                # Claimed by another worker in the meantime
+                continue
+            os.utime(claimed_path)
+            return claimed_path
+        return None
+
+    def beat(self, claimed_path: str) -> bool:
+        """
+        Heartbeat of a running job: update the modification time of its file.
+        :return: False if the job has been released because it was considered dead
+        """
+        try:
+            os.utime(claimed_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def finish(self, claimed_path: str, success: bool = True):
+        file_name = os.path.basename(claimed_path).split("@")[0]
+        state = "done" if success else "failed"
+        try:
+            os.rename(claimed_path, self._path(state, file_name))
+        except FileNotFoundError:
+            # The job has been released in the meantime and will be run again
+            pass
+
+    def release_stale(self) -> List[str]:
+        """
+        Put back in the pending folder the jobs of the workers that stopped
+        sending heartbeats.
+        :return: the names of the released job files
+        """
+        released = []
+        now = time.time()
+        for file_name in os.listdir(os.path.join(self.queue_dir, "claimed")):
+            claimed_path = self._path("claimed", file_name)
+            try:
+                if now - os.path.getmtime(claimed_path) < self.timeout:
+                    continue
+                pending_path = self._path("pending", file_name.split("@")[0])
+                os.rename(claimed_path, pending_path)
+            except FileNotFoundError:
+                continue
+            released.append(file_name)
+        return released
+
+    def summary(self) -> Dict[str, int]:
+        summary = {}
+        for state in STATES:
+            files = os.listdir(os.path.join(self.queue_dir, state))
+            summary[state] = len([x for x in files if ".json" in x])
+        return summary
+
+    def work(
+        self,
+        run_job: Callable[..., bool],
+        worker_id: Optional[str] = None,
+        wait: bool = False,
+        poll: float = 5,
+    ):
+        """
+        Claim and run jobs until the queue is empty.
+        :param run_job: function called with the job arguments, returns the success
+        :param worker_id: identifier of the worker, default to <host>-<pid>
+        :param wait: keep polling while other workers still have claimed jobs,
+            to take over the jobs of workers that die
+        :param poll: seconds between two polls when waiting
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        while True:
+            claimed_path = self.claim(worker_id)
+            if claimed_path is None:
+                if wait and self.summary()["claimed"] > 0:
+                    time.sleep(poll)
+                    continue
+                return
+            with open(claimed_path) as f:
+                job = json.load(f)
+            stop = threading.Event()
+            beater = threading.Thread(
+                target=self._beat_until, args=(claimed_path, stop), daemon=True
+            )
+            beater.start()
+            try:
+                success = run_job(**job)
+            except Exception:
+                success = False
+            finally:
+                stop.set()
+                beater.join()
+            self.finish(claimed_path, success)
+
+    def _beat_until(self, claimed_path: str, stop: threading.Event):
+        while not stop.wait(self.heartbeat):
+            if not self.beat(claimed_path):
+                return
+
+
+class DistributedScoreComputation(ScoreComputation):
+    def __init__(self, *args, queue_dir: Optional[str] = None, **kwargs):
+        """
+        Compute the scores with any number of workers, on any host that mounts
+        the same `docker_data` folder.
+        :param queue_dir: folder of the queue, default to docker_data/queue/<dataset>
+        """
+        super().__init__(*args, **kwargs)
+        dataset = os.path.basename(os.path.normpath(self.output_path))
+        self.queue_dir = queue_dir or os.path.join("docker_data", "queue", dataset)
+        self.queue = WorkQueue(self.queue_dir)
+
+    def submit(self) -> int:
+        """
+        Add all the challenges of the dataset to the queue.
+        :return: number of added challenges
+        """
+        n_added = 0
+        for paths in self.get_challenges():
+            name = os.path.basename(os.path.normpath(paths[1]))
+            keys = ["native_path", "pred_path", "output_path", "log_path", "time_path"]
+            n_added += self.queue.submit(name, dict(zip(keys, paths)))
+        return n_added
+
+    def run_benchmark(self, wait: bool = True):
+        """
+        Run as a worker: claim challenges until all of them are computed.
+        """
+        os.makedirs(self.output_path, exist_ok=True)
+        os.makedirs(self.time_path, exist_ok=True)
+        os.makedirs(self.log_path, exist_ok=True)
+        self.queue.work(self._run_job, wait=wait)
+
+    def _run_job(self, **paths) -> bool:
+        """
+        Run the docker command of a job, without "-it": the workers usually run
+        without a terminal (ssh, nohup, systemd), where docker refuses to start.
+        """
+        challenge = os.path.basename(os.path.normpath(paths["pred_path"]))
+        name = f"rnadvisor_{challenge}_{os.getpid()}"
+        return subprocess.run(self.get_command(**paths, name=name)).returncode == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed score computation")
+    parser.add_argument("action", choices=["submit", "work", "status"])
+    parser.add_argument(
+        "--datasets", nargs="+", default=["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]
+    )
+    args = parser.parse_args()
+    prefix = os.path.join("docker_data", "input")
+    for dataset in args.datasets:
+        if args.action == "submit":
+            # The workers score the normalized structures given in the jobs
+            NATIVE_PATHS, PREDS_PATHS = normalize_dataset(
+                dataset, prefix, n_jobs=os.cpu_count() or 1
+            )
+        else:
+            NATIVE_PATHS = os.path.join(prefix, dataset, "NORMALIZED", "NATIVE")
+            PREDS_PATHS = os.path.join(prefix, dataset, "NORMALIZED", "PREDS")
+        OUTPUT_PATH = os.path.join(prefix.replace("input", "output"), dataset)
+        score_computation = DistributedScoreComputation(
+            NATIVE_PATHS, PREDS_PATHS, OUTPUT_PATH
+        )
+        if args.action == "submit":
+            print(f"{dataset}: {score_computation.submit()} challenges submitted")
+        elif args.action == "work":
+            score_computation.run_benchmark()
+        else:
+            print(f"{dataset}: {score_computation.queue.summary()}")
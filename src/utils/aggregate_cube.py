@@ -0,0 +1,177 @@
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.viz.enum import NAMES_TO_LENGTH, OLD_TO_NEW
+
+CUBE_DIR = os.path.join("docker_data", "output", "cube")
+# Edges of the RNA length bins (in nucleotides)
+LENGTH_BINS = [0, 50, 100, 200, 500, np.inf]
+LENGTH_LABELS = ["<50 nt", "50-100 nt", "100-200 nt", "200-500 nt", ">500 nt"]
+STATS = ["count", "sum", "sumsq", "min", "max", "median", "first"]
+CELL_KEYS = ["dataset", "target", "length", "length_bin", "model", "metric"]
+
+
+class AggregateCube:
+    def __init__(self, cube_dir: str = CUBE_DIR):
+        """
+        Precomputed aggregates of the scores over
+        dataset x model x metric x target x RNA length bin.
+        Each cell stores the count, sum, sum of squares, min, max and median of
+        the metric over all the decoys of a model for a target, as well as the
+        value of the first decoy (the one kept for the heatmaps and tables).
+        The count, sum, sum of squares, min and max can be rolled up to any
+        coarser level; the median is only available per cell.
+        :param cube_dir: folder where the cube of each dataset is stored
+        """
+        self.cube_dir = cube_dir
+        os.makedirs(cube_dir, exist_ok=True)
+
+    def _path(self, dataset: str) -> str:
+        return os.path.join(self.cube_dir, f"{dataset}.csv")
+
+    def get_length_bin(self, dataset: str, target: str):
+        lengths = NAMES_TO_LENGTH.get(dataset, {})
+        length = lengths.get(OLD_TO_NEW.get(target, target), np.nan)
+        if np.isnan(length):
+            return length, "unknown"
+        index = np.searchsorted(LENGTH_BINS, length, side="right") - 1
+        return length, LENGTH_LABELS[index]
+
+    def compute_cells(self, dataset: str, csv_path: str) -> pd.DataFrame:
+        """
+        Compute the cells of one challenge .csv file.
+        :return: one row per (model, metric) with the different statistics
+        """
+        target = os.path.basename(csv_path).replace(".csv", "")
+        df = pd.read_csv(csv_path, index_col=[0])
+        df.index.name = "decoy"
+        df["model"] = [name.split("_")[1] for name in df.index]
+        long_df = df.reset_index().melt(
+            id_vars=["decoy", "model"], var_name="metric", value_name="value"
+        )
+        long_df["value"] = long_df["value"].astype(float)
+        long_df["square"] = long_df["value"] ** 2
+        grouped = long_df.groupby(["model", "metric"], sort=False)
+        cells = grouped["value"].agg(["count", "sum", "min", "max", "median"])
+        cells["sumsq"] = grouped["square"].sum()
+        first = df.groupby("model", sort=False).head(1).set_index("model")
+        first = first.stack(dropna=False)
+        cells["first"] = first.rename_axis(["model", "metric"])
+        cells = cells.reset_index()
+        length, length_bin = self.get_length_bin(dataset, target)
+        cells.insert(0, "dataset", dataset)
+        cells.insert(1, "target", target)
+        cells.insert(2, "length", length)
+        cells.insert(3, "length_bin", length_bin)
+        return cells[CELL_KEYS + STATS]
+
+    def read(self, dataset: str) -> pd.DataFrame:
+        """
+        Return the cube of a dataset (empty if it was never computed).
+        """
+        if not os.path.exists(self._path(dataset)):
+            return pd.DataFrame(columns=CELL_KEYS + STATS + ["mtime"])
+        return pd.read_csv(self._path(dataset))
+
+    def update(self, dataset: str, csv_folder: str) -> List[str]:
+        """
+        Update the cube with the .csv files that are new or have changed since
+        the last update, and remove the targets whose file has been deleted.
+        :return: the updated targets
+        """
+        cube = self.read(dataset)
+        mtimes = cube.groupby("target")["mtime"].first().to_dict()
+        files = {
+            x.replace(".csv", ""): os.path.join(csv_folder, x)
+            for x in os.listdir(csv_folder)
+            if x.endswith(".csv")
+        }
+        updated, new_cells = [], []
+        for target, csv_path in sorted(files.items()):
+            mtime = os.stat(csv_path).st_mtime_ns
+            if mtimes.get(target) == mtime:
+                continue
+            new_cells.append(self.compute_cells(dataset, csv_path).assign(mtime=mtime))
+            updated.append(target)
+        removed = set(mtimes) - set(files)
+        if not updated and not removed:
+            return updated
+        cube = cube[~cube["target"].isin(updated + list(removed))]
+        cube = pd.concat([x for x in [cube, *new_cells] if len(x) > 0])
+        tmp_path = f"{self._path(dataset)}.{os.getpid()}.tmp"
+        cube.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self._path(dataset))
+        return updated
+
+    def rollup(
+        self,
+        dataset: str,
+        by: List[str],
+        targets: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Aggregate the cells to a coarser level.
+        :param by: the keys to keep, e.g. ["model", "metric", "length_bin"]
+        :param targets: restrict the aggregation to these targets
+        :return: count, sum, sumsq, min, max, mean and std for each group
+        """
+        cube = self.read(dataset)
+        if targets is not None:
+            cube = cube[cube["target"].isin(targets)]
+        df = cube.groupby(by).agg(
+            count=("count", "sum"),
+            sum=("sum", "sum"),
+            sumsq=("sumsq", "sum"),
+            min=("min", "min"),
+            max=("max", "max"),
+        )
+        df["mean"] = df["sum"] / df["count"].replace(0, np.nan)
+        variance = df["sumsq"] / df["count"].replace(0, np.nan) - df["mean"] ** 2
+        df["std"] = np.sqrt(variance.clip(lower=0))
+        return df.reset_index()
+
+    def get_first_values(self, dataset: str) -> pd.DataFrame:
+        """
+        Return the value of the first decoy of each (target, model, metric),
+        with the same format as the rows of VizAbstract.scores_df.
+        """
+        cube = self.read(dataset)
+        df = cube[["target", "model", "metric", "first"]].rename(
+            columns={
+                "target": "RNA_name",
+                "model": "Model",
+                "metric": "Metric_name",
+                "first": "Metric",
+            }
+        )
+        return df
+
+    def get_mean_by_target(
+        self, dataset: str, models: List[str], targets: Optional[List[str]] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Return, for each model, the mean of each metric per target over all the
+        decoys whose model contains the model name (as in VizPolar).
+        :return: dictionary with the model and a target x metric dataframe
+        """
+        cube = self.read(dataset)
+        if targets is not None:
+            cube = cube[cube["target"].isin(targets)]
+        out = {}
+        for model in models:
+            cells = cube[cube["model"].str.contains(model, regex=False)]
+            sums = cells.groupby(["target", "metric"])[["sum", "count"]].sum()
+            means = sums["sum"] / sums["count"].replace(0, np.nan)
+            out[model] = means.unstack("metric")
+        return out
+
+
+if __name__ == "__main__":
+    cube = AggregateCube()
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        csv_folder = os.path.join("docker_data", "output", dataset)
+        updated = cube.update(dataset, csv_folder)
+        print(f"{dataset}: {len(updated)} challenges updated")
@@ -0,0 +1,159 @@
+import fcntl
+import hashlib
+import os
+import pickle
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+CACHE_DIR = os.path.join("docker_data", "cache")
+# Default size of the cache on the disk (in bytes)
+MAX_BYTES = 2 * 1024**3
+
+
+def hash_files(paths: List[str]) -> str:
+    """
+    Return a hash of the names and contents of some files.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Return the key of an entry from the content it depends on (strings or bytes).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        part = part if isinstance(part, bytes) else str(part).encode()
+        # Prefix each part with its length so that ("ab", "c") != ("a", "bc")
+        digest.update(len(part).to_bytes(8, "little") + part)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        """
+        Content-addressed cache on the disk, shared by the processes that use the
+        same folder. The entries are written atomically and the least recently
+        used ones are removed when the cache is larger than max_bytes.
+        :param cache_dir: folder of the entries
+        :param max_bytes: size of the cache above which entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits, self.misses = 0, 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = []
+        for sub_dir in os.scandir(self.cache_dir):
+            if sub_dir.is_dir():
+                entries.extend(
+                    x for x in os.scandir(sub_dir.path) if not x.name.endswith(".tmp")
+                )
+        return entries
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """
+        Exclusive lock between the processes, held during the evictions.
+        """
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """
+        Return the content of an entry, or None if it is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+            # The modification time gives the order of the evictions
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another process
+            self.misses += 1
+            return None
+        self.hits += 1
+        return content
+
+    def set_bytes(self, key: str, content: bytes):
+        """
+        Write an entry, then evict the oldest entries if the cache is too large.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def get(self, key: str) -> Any:
+        """
+        Return the python object of an entry, or None if it is not in the cache.
+        """
+        content = self.get_bytes(key)
+        return None if content is None else pickle.loads(content)
+
+    def set(self, key: str, value: Any):
+        self.set_bytes(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        :return: number of removed entries
+        """
+        with self._lock():
+            entries = []
+            for entry in self._entries():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            size = sum(x[1] for x in entries)
+            n_removed = 0
+            for _, entry_size, path in sorted(entries):
+                if size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                n_removed += 1
+        return n_removed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the hits and misses counted by this instance, and the size of the
+        cache.
+        """
+        sizes = []
+        for entry in self._entries():
+            try:
+                sizes.append(entry.stat().st_size)
+            except FileNotFoundError:
+                continue
+        return dict(
+            hits=self.hits, misses=self.misses, entries=len(sizes), bytes=sum(sizes)
+        )
+
+
+if __name__ == "__main__":
+    disk_cache = DiskCache()
+    stats = disk_cache.stats()
+    print(f"{stats['entries']} entries, {stats['bytes'] / 1024**2:.1f} MB")
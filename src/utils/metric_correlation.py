@@ -0,0 +1,218 @@
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.viz.enum import ASC_METRICS_ALL, DESC_METRICS_ALL
+
+# Number of rows (decoys, or pairs of decoys) processed at once
+CHUNK_SIZE = 100000
+# 1 if higher is better, -1 if lower is better
+DIRECTIONS = {
+    **{metric: 1 for metric in ASC_METRICS_ALL},
+    **{metric: -1 for metric in DESC_METRICS_ALL},
+}
+
+
+def chunked_pearson(values: np.ndarray, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """
+    Pearson correlation between all the columns, over the rows where both columns
+    are defined (pairwise deletion of the NaN).
+    The sums are accumulated by chunks of rows, so the memory does not depend on
+    the number of rows.
+    :param values: array of shape (n_rows, n_metrics)
+    :return: correlation matrix of shape (n_metrics, n_metrics)
+    """
+    n_metrics = values.shape[1]
+    # Center the values first to avoid the cancellation of the large sums
+    with np.errstate(all="ignore"):
+        means = np.nan_to_num(np.nanmean(values, axis=0))
+    count, sum_x, sum_xx, sum_xy = np.zeros((4, n_metrics, n_metrics))
+    for start in range(0, len(values), chunk_size):
+        centered = values[start : start + chunk_size] - means
+        mask = (~np.isnan(centered)).astype(float)
+        centered = np.nan_to_num(centered)
+        count += mask.T @ mask
+        # sum_x[i, j]: sum of the metric i over the rows where j is also defined
+        sum_x += centered.T @ mask
+        sum_xx += (centered**2).T @ mask
+        sum_xy += centered.T @ centered
+    with np.errstate(all="ignore"):
+        covariance = count * sum_xy - sum_x * sum_x.T
+        variance = (count * sum_xx - sum_x**2) * (count * sum_xx.T - sum_x.T**2)
+        correlation = covariance / np.sqrt(variance)
+    return np.clip(correlation, -1, 1)
+
+
+def rank_columns(values: np.ndarray) -> np.ndarray:
+    """
+    Rank each column (average rank for the ties), keeping the NaN.
+    """
+    order = np.argsort(values, axis=0, kind="stable")
+    ranks = np.full(values.shape, np.nan)
+    for col in range(values.shape[1]):
+        column = values[order[:, col], col]
+        defined = ~np.isnan(column)
+        sorted_values = column[defined]
+        # Average rank of the ties: mean of the first and last position
+        first = np.searchsorted(sorted_values, sorted_values, side="left")
+        last = np.searchsorted(sorted_values, sorted_values, side="right")
+        ranks[order[:, col][defined], col] = (first + last + 1) / 2
+    return ranks
+
+
+def pairwise_spearman(values: np.ndarray, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """
+    Spearman correlation between all the columns, over the rows where both columns
+    are defined: the two columns are ranked over these rows only.
+    The columns with the same missing values are ranked together, so there is
+    one ranking per couple of missing value patterns, not per couple of columns.
+    :param values: array of shape (n_rows, n_metrics)
+    :return: correlation matrix of shape (n_metrics, n_metrics)
+    """
+    defined = ~np.isnan(values)
+    patterns, pattern_of = np.unique(defined, axis=1, return_inverse=True)
+    pattern_of = pattern_of.ravel()
+    correlation = np.full((values.shape[1], values.shape[1]), np.nan)
+    for pattern_1 in range(patterns.shape[1]):
+        for pattern_2 in range(pattern_1, patterns.shape[1]):
+            rows = patterns[:, pattern_1] & patterns[:, pattern_2]
+            cols = np.flatnonzero(np.isin(pattern_of, [pattern_1, pattern_2]))
+            ranks = rank_columns(values[np.ix_(rows, cols)])
+            # Keep only the couples of columns with one pattern each
+            col_patterns = pattern_of[cols]
+            is_pair = (col_patterns[:, None] == pattern_1) & (
+                col_patterns[None, :] == pattern_2
+            )
+            is_pair |= is_pair.T
+            pair = np.ix_(cols, cols)
+            correlation[pair] = np.where(
+                is_pair, chunked_pearson(ranks, chunk_size), correlation[pair]
+            )
+    return correlation
+
+
+def chunked_agreement(
+    values: np.ndarray, directions: np.ndarray, chunk_size: int = CHUNK_SIZE
+) -> np.ndarray:
+    """
+    Pairwise ranking agreement between all the columns: for each couple of rows,
+    check whether two metrics agree on which row is better.
+    The pairs where one of the metrics is tied or undefined are not counted.
+    :param values: array of shape (n_rows, n_metrics), the rows of one target
+    :param directions: 1 if higher is better for the metric, -1 if lower is
+        better, 0 if unknown (all its pairs are then ties and are not counted)
+    :return: number of concordant and discordant pairs for each couple of metrics,
+        as an array of shape (2, n_metrics, n_metrics)
+    """
+    n_rows, n_metrics = values.shape
+    values = values * directions
+    concordant, discordant = np.zeros((2, n_metrics, n_metrics))
+    n_chunk = max(chunk_size // max(n_rows, 1), 1)
+    for start in range(0, n_rows, n_chunk):
+        rows = np.arange(start, min(start + n_chunk, n_rows))
+        diff = values[rows, None, :] - values[None, :, :]
+        # Keep each pair once
+        diff = diff[rows[:, None] < np.arange(n_rows)[None, :]]
+        better, worse = (diff > 0).astype(float), (diff < 0).astype(float)
+        concordant += better.T @ better + worse.T @ worse
+        discordant += better.T @ worse + worse.T @ better
+    return np.stack([concordant, discordant])
+
+
+class MetricCorrelation:
+    def __init__(
+        self,
+        dfs: Dict[str, pd.DataFrame],
+        metrics: Optional[List[str]] = None,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        """
+        Correlation and agreement between the metrics, over all the decoys of
+        a dataset (and not only the first decoy of each model).
+        :param dfs: dictionary with the target and its scores (one row per decoy,
+            one column per metric), as the .csv files
+        :param metrics: metrics to compare, default to all the metrics that have
+            at least one value
+        :param chunk_size: number of rows processed at once
+        """
+        df = pd.concat(dfs.values(), keys=dfs.keys(), names=["target", "decoy"])
+        if metrics is None:
+            metrics = df.columns[df.notna().any()].tolist()
+        self.metrics = metrics
+        self.values = df[metrics].to_numpy(dtype=float, na_value=np.nan)
+        # Some metrics are infinite when they can not be computed (e.g. DI)
+        self.values[~np.isfinite(self.values)] = np.nan
+        self.targets = df.index.get_level_values("target").to_numpy()
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def read_folder(csv_folder: str, **kwargs) -> "MetricCorrelation":
+        """
+        Read all the .csv files of a dataset folder.
+        """
+        dfs = {
+            x.replace(".csv", ""): pd.read_csv(
+                os.path.join(csv_folder, x), index_col=[0]
+            )
+            for x in sorted(os.listdir(csv_folder))
+            if x.endswith(".csv")
+        }
+        return MetricCorrelation(dfs, **kwargs)
+
+    def _to_df(self, matrix: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(matrix, index=self.metrics, columns=self.metrics)
+
+    def pearson(self) -> pd.DataFrame:
+        """
+        Pearson correlation between the metrics over all the decoys.
+        """
+        return self._to_df(chunked_pearson(self.values, self.chunk_size))
+
+    def spearman(self) -> pd.DataFrame:
+        """
+        Spearman correlation between the metrics over all the decoys where both
+        metrics are defined.
+        """
+        return self._to_df(pairwise_spearman(self.values, self.chunk_size))
+
+    def agreement(self) -> pd.DataFrame:
+        """
+        Fraction of the pairs of decoys of a same target for which two metrics
+        agree on the best decoy (with the direction of each metric).
+        The metrics of unknown direction have no agreement (NaN).
+        """
+        directions = np.array([DIRECTIONS.get(metric, 0) for metric in self.metrics])
+        counts = np.zeros((2, len(self.metrics), len(self.metrics)))
+        for target in pd.unique(self.targets):
+            values = self.values[self.targets == target]
+            counts += chunked_agreement(values, directions, self.chunk_size)
+        concordant, discordant = counts
+        with np.errstate(all="ignore"):
+            return self._to_df(concordant / (concordant + discordant))
+
+    def get_redundant_pairs(self, threshold: float = 0.9) -> pd.DataFrame:
+        """
+        Return the couples of metrics whose absolute Spearman correlation is
+        above the threshold, i.e. the metrics that could be computed only once.
+        """
+        spearman, agreement = self.spearman(), self.agreement()
+        rows = [
+            (metric_1, metric_2, spearman.iloc[i, j], agreement.iloc[i, j])
+            for i, metric_1 in enumerate(self.metrics)
+            for j, metric_2 in enumerate(self.metrics)
+            if i < j and abs(spearman.iloc[i, j]) >= threshold
+        ]
+        df = pd.DataFrame(
+            rows, columns=["Metric 1", "Metric 2", "Spearman", "Agreement"]
+        )
+        return df.sort_values("Spearman", key=np.abs, ascending=False)
+
+
+if __name__ == "__main__":
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        csv_folder = os.path.join("docker_data", "output", dataset)
+        metric_correlation = MetricCorrelation.read_folder(csv_folder)
+        print(dataset)
+        print(metric_correlation.get_redundant_pairs().to_string(index=False))
@@ -0,0 +1,119 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.viz.enum import ASC_METRICS, DESC_METRICS
+
+MEAN_RANK = "Mean rank"
+
+
+def nan_mean(values: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Mean over an axis without the NaN (NaN, without warning, if all are NaN).
+    """
+    defined = ~np.isnan(values)
+    with np.errstate(all="ignore"):
+        return np.where(defined, values, 0).sum(axis=axis) / defined.sum(axis=axis)
+
+
+class ModelRanking:
+    def __init__(self, scores_df: pd.DataFrame, metrics: Optional[List[str]] = None):
+        """
+        Rank the models on each target, for each metric.
+        The ranks of all the (target, metric) groups are computed in a single
+        groupby-rank: the scores of the metrics where higher is better are
+        negated, so that the best model always has the rank 1.
+        The ranks are then kept as a dense target x model x metric array, so the
+        averages and win counts are reductions over one of its axes.
+        Ties share the best rank (1, 1, 3, ...) and missing scores are not ranked.
+        :param scores_df: scores with one row per RNA_name, Model and Metric_name,
+            as the scores_df of the visualisations
+        :param metrics: metrics to rank, default to ASC_METRICS and DESC_METRICS
+        """
+        metrics = metrics if metrics is not None else ASC_METRICS + DESC_METRICS
+        df = scores_df[scores_df["Metric_name"].isin(metrics)]
+        target_codes, self.targets = pd.factorize(df["RNA_name"], sort=True)
+        model_codes, self.models = pd.factorize(df["Model"], sort=True)
+        metric_codes, metric_names = pd.factorize(df["Metric_name"])
+        self.metrics = [x for x in metrics if x in set(metric_names)]
+        metric_codes = pd.Index(self.metrics).get_indexer(metric_names)[metric_codes]
+        signs = np.where(np.isin(self.metrics, ASC_METRICS), -1.0, 1.0)
+        values = df["Metric"].to_numpy(dtype=float) * signs[metric_codes]
+        # One integer key per (target, metric): faster to group than the names
+        groups = target_codes * len(self.metrics) + metric_codes
+        ranks = pd.Series(values).groupby(groups).rank(method="min").to_numpy()
+        # Dense array of the ranks: target x model x metric (NaN if not scored)
+        self.ranks = np.full(
+            (len(self.targets), len(self.models), len(self.metrics)), np.nan
+        )
+        self.ranks[target_codes, model_codes, metric_codes] = ranks
+
+    def get_target_ranks(self) -> pd.DataFrame:
+        """
+        Return the rank of each model on each target, for each metric, and its
+        rank averaged over the metrics.
+        :return: dataframe with (RNA_name, Model) as index and the metrics as columns
+        """
+        index = pd.MultiIndex.from_product(
+            [self.targets, self.models], names=["RNA_name", "Model"]
+        )
+        df = pd.DataFrame(
+            self.ranks.reshape(-1, len(self.metrics)),
+            index=index,
+            columns=pd.Index(self.metrics, name="Metric_name"),
+        )
+        df[MEAN_RANK] = self._get_mean_over_metrics().ravel()
+        # Remove the models that have not been scored on a target
+        return df[df[MEAN_RANK].notna()]
+
+    def _get_mean_over_metrics(self) -> np.ndarray:
+        """
+        Return the rank of each model on each target, averaged over the metrics.
+        :return: array of shape target x model
+        """
+        return nan_mean(self.ranks, axis=2)
+
+    def get_mean_ranks(self) -> pd.DataFrame:
+        """
+        Return the rank of each model averaged over the targets, for each metric
+        and for the rank averaged over the metrics.
+        :return: dataframe with the models as index
+        """
+        ranks = np.concatenate(
+            [self.ranks, self._get_mean_over_metrics()[:, :, None]], axis=2
+        )
+        return self._to_df(nan_mean(ranks, axis=0))
+
+    def get_wins(self) -> pd.DataFrame:
+        """
+        Return the number of targets won by each model (rank 1, ties included) for
+        each metric, and for the rank averaged over the metrics.
+        :return: dataframe with the models as index
+        """
+        mean_ranks = self._get_mean_over_metrics()
+        best = np.min(mean_ranks, axis=1, initial=np.inf, where=~np.isnan(mean_ranks))
+        wins = np.concatenate(
+            [self.ranks == 1, (mean_ranks == best[:, None])[:, :, None]], axis=2
+        )
+        return self._to_df(wins.sum(axis=0))
+
+    def _to_df(self, matrix: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            matrix,
+            index=pd.Index(self.models, name="Model"),
+            columns=pd.Index(self.metrics + [MEAN_RANK], name="Metric_name"),
+        )
+
+
+if __name__ == "__main__":
+    from src.viz.enum import MODELS
+    from src.viz.viz_abstract import VizAbstract
+
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        csv_folder = os.path.join("docker_data", "output", dataset)
+        scores_df = VizAbstract(csv_folder, dataset).scores_df
+        model_ranking = ModelRanking(scores_df[scores_df["Model"].isin(MODELS)])
+        print(dataset)
+        print(model_ranking.get_mean_ranks().sort_values(MEAN_RANK).round(2))
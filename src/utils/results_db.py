@@ -0,0 +1,242 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DB_PATH = os.path.join("docker_data", "output", "scores.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    dataset TEXT NOT NULL,
+    target TEXT NOT NULL,
+    model TEXT NOT NULL,
+    decoy TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    position INTEGER NOT NULL,
+    metric_position INTEGER NOT NULL,
+    PRIMARY KEY (dataset, target, model, decoy, metric)
+);
+CREATE INDEX IF NOT EXISTS scores_model_metric ON scores (dataset, model, metric);
+CREATE TABLE IF NOT EXISTS sources (
+    dataset TEXT NOT NULL,
+    target TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (dataset, target)
+);
+"""
+
+UPSERT = """
+INSERT INTO scores
+(dataset, target, model, decoy, metric, value, position, metric_position)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (dataset, target, model, decoy, metric)
+DO UPDATE SET value = excluded.value, position = excluded.position,
+metric_position = excluded.metric_position
+"""
+
+
+def get_model_from_decoy(decoy: str) -> str:
+    """
+    Return the model name from a prediction name.
+    Example: normalized_rhofold_R1107.pdb -> rhofold
+    """
+    return decoy.split("_")[1]
+
+
+class ResultsDB:
+    def __init__(self, db_path: str = DB_PATH):
+        """
+        Single indexed SQLite database with all the scores of all the datasets.
+        Scores are keyed by (dataset, target, model, decoy, metric).
+        :param db_path: path to the sqlite file
+        """
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [x[1] for x in conn.execute("PRAGMA table_info(scores)")]
+            if "metric_position" not in columns:
+                # Database of a previous version: all the files are imported again
+                conn.execute(
+                    "ALTER TABLE scores ADD COLUMN metric_position "
+                    "INTEGER NOT NULL DEFAULT 0"
+                )
+                conn.execute("DELETE FROM sources")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection that commits on success and is always closed.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def import_csv(self, dataset: str, csv_path: str) -> int:
+        """
+        Upsert the scores of a challenge .csv file (one row per decoy, one column
+        per metric). The name of the file is used as target name.
+        :return: number of upserted scores
+        """
+        target = os.path.basename(csv_path).replace(".csv", "")
+        df = pd.read_csv(csv_path, index_col=[0])
+        metrics = df.columns.tolist()
+        values = df.to_numpy(dtype=float, na_value=np.nan)
+        rows = [
+            (
+                dataset,
+                target,
+                get_model_from_decoy(decoy),
+                decoy,
+                metric,
+                None if np.isnan(value) else float(value),
+                position,
+                metric_position,
+            )
+            for position, decoy in enumerate(df.index)
+            for metric_position, (metric, value) in enumerate(
+                zip(metrics, values[position])
+            )
+        ]
+        decoys = df.index.tolist()
+        with self._connect() as conn:
+            # Remove the decoys that are not in the new version of the file
+            conn.execute(
+                "DELETE FROM scores WHERE dataset = ? AND target = ? "
+                f"AND decoy NOT IN ({','.join('?' * len(decoys))})",
+                [dataset, target, *decoys],
+            )
+            conn.executemany(UPSERT, rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                (dataset, target, os.path.getmtime(csv_path)),
+            )
+        return len(rows)
+
+    def import_folder(self, dataset: str, csv_folder: str) -> List[str]:
+        """
+        Import the .csv files of a dataset folder that are new or changed since
+        the last import, and remove the targets whose file has been removed.
+        :return: the imported targets
+        """
+        with self._connect() as conn:
+            mtimes = dict(
+                conn.execute(
+                    "SELECT target, mtime FROM sources WHERE dataset = ?", (dataset,)
+                ).fetchall()
+            )
+        csv_files = sorted(x for x in os.listdir(csv_folder) if x.endswith(".csv"))
+        imported = []
+        for csv_file in csv_files:
+            csv_path = os.path.join(csv_folder, csv_file)
+            target = csv_file.replace(".csv", "")
+            if mtimes.get(target) == os.path.getmtime(csv_path):
+                continue
+            self.import_csv(dataset, csv_path)
+            imported.append(target)
+        # The scores of the removed files would still be read from the database
+        for target in set(mtimes) - {x.replace(".csv", "") for x in csv_files}:
+            self.remove_target(dataset, target)
+        return imported
+
+    def remove_target(self, dataset: str, target: str):
+        """
+        Remove all the scores of a target.
+        """
+        with self._connect() as conn:
+            for table in ["scores", "sources"]:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE dataset = ? AND target = ?",
+                    (dataset, target),
+                )
+
+    def get_targets(self, dataset: str) -> List[str]:
+        """
+        Return the targets of a dataset.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT target FROM scores WHERE dataset = ? ORDER BY target",
+                (dataset,),
+            ).fetchall()
+        return [target for (target,) in rows]
+
+    def query(
+        self,
+        dataset: str,
+        targets: Optional[List[str]] = None,
+        models: Optional[List[str]] = None,
+        metrics: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Return the scores of a dataset in long format, optionally filtered.
+        :return: dataframe with target, model, decoy, metric, value, position (of
+            the decoy) and metric_position (of the metric in the .csv file)
+        """
+        query = "SELECT target, model, decoy, metric, value, position, metric_position"
+        query += " FROM scores"
+        query += " WHERE dataset = ?"
+        params: List = [dataset]
+        for column, values in [
+            ("target", targets),
+            ("model", models),
+            ("metric", metrics),
+        ]:
+            if values is not None:
+                query += f" AND {column} IN ({','.join('?' * len(values))})"
+                params.extend(values)
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def get_mean(self, dataset: str, model: str, metric: str) -> float:
+        """
+        Return the mean of a metric for a model over all its decoys of a dataset.
+        """
+        with self._connect() as conn:
+            (mean,) = conn.execute(
+                "SELECT AVG(value) FROM scores "
+                "WHERE dataset = ? AND model = ? AND metric = ?",
+                (dataset, model, metric),
+            ).fetchone()
+        return np.nan if mean is None else mean
+
+    def read_dataset(
+        self, dataset: str, targets: Optional[List[str]] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Return the scores of a dataset with the same format as the .csv files:
+        one dataframe per target, with the decoys as index and metrics as columns.
+        """
+        df = self.query(dataset, targets=targets)
+        out = {}
+        for target, target_df in df.groupby("target", sort=True):
+            pivot_df = target_df.pivot(
+                index=["position", "decoy"], columns="metric", values="value"
+            ).sort_index()
+            pivot_df.index = pivot_df.index.get_level_values("decoy")
+            # Columns in the order of the .csv file, and not sorted by name
+            metrics = target_df.drop_duplicates("metric").sort_values(
+                "metric_position"
+            )["metric"]
+            pivot_df = pivot_df[metrics.tolist()]
+            pivot_df.index.name = None
+            pivot_df.columns.name = None
+            out[target] = pivot_df
+        return out
+
+
+if __name__ == "__main__":
+    results_db = ResultsDB()
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        csv_folder = os.path.join("docker_data", "output", dataset)
+        imported = results_db.import_folder(dataset, csv_folder)
+        print(f"{dataset}: {len(imported)} challenges imported")
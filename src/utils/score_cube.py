@@ -0,0 +1,205 @@
+import fcntl
+import glob
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.utils.results_db import get_model_from_decoy
+
+NPY_DIR = os.path.join("docker_data", "output", "npy")
+AXES = ["metrics", "targets", "models", "decoys"]
+
+
+class ScoreCube:
+    def __init__(self, npy_dir: str = NPY_DIR):
+        """
+        Dense float32 cube of the scores of each dataset, of shape
+        metric x target x model x decoy, saved as a .npy file.
+        The metric is the first axis: the scores of one metric are contiguous
+        on the disk.
+        A .json sidecar gives the labels of each axis: the targets, models and
+        metrics, and the names of the decoys of each (target, model).
+        The decoys of a model are in the order of the .csv file, so decoy 0 is
+        the one kept for the heatmaps and box plots. Missing values are NaN.
+        The cube is opened as a read-only memory map: the slices do not copy
+        the data and the processes that read it share the page cache.
+        :param npy_dir: folder where the cube of each dataset is stored
+        """
+        self.npy_dir = npy_dir
+        os.makedirs(npy_dir, exist_ok=True)
+
+    def _json_path(self, dataset: str) -> str:
+        return os.path.join(self.npy_dir, f"{dataset}.json")
+
+    @contextmanager
+    def _lock(self, dataset: str) -> Iterator[None]:
+        """
+        Exclusive lock between the processes that export the cube of a dataset.
+        """
+        with open(os.path.join(self.npy_dir, f".{dataset}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_labels(self, dataset: str) -> Dict:
+        """
+        Return the labels of the cube of a dataset (empty if it was never exported).
+        """
+        if not os.path.exists(self._json_path(dataset)):
+            return {}
+        with open(self._json_path(dataset)) as file:
+            return json.load(file)
+
+    def export(
+        self,
+        dataset: str,
+        dfs: Dict[str, pd.DataFrame],
+        mtimes: Optional[Dict[str, int]] = None,
+    ) -> Tuple[int, ...]:
+        """
+        Write the cube of a dataset.
+        Each export is written in a new .npy file and the sidecar, which gives the
+        name of the .npy file, is replaced last: the readers always see a cube
+        and labels that match, and the cubes already opened stay valid.
+        The exports of a dataset are done one at a time (with a file lock).
+        :param dfs: dictionary with the target and its scores (one row per decoy,
+            one column per metric), as the .csv files
+        :param mtimes: modification times of the .csv files, kept in the sidecar
+        :return: the shape of the cube
+        """
+        with self._lock(dataset):
+            return self._export(dataset, dfs, mtimes)
+
+    def _export(
+        self,
+        dataset: str,
+        dfs: Dict[str, pd.DataFrame],
+        mtimes: Optional[Dict[str, int]] = None,
+    ) -> Tuple[int, ...]:
+        targets = sorted(dfs)
+        decoys: Dict[str, Dict[str, List[str]]] = {}
+        models: List[str] = []
+        metrics: List[str] = []
+        for target in targets:
+            metrics.extend(x for x in dfs[target].columns if x not in metrics)
+            decoys[target] = {}
+            for decoy in dfs[target].index:
+                model = get_model_from_decoy(decoy)
+                decoys[target].setdefault(model, []).append(decoy)
+                if model not in models:
+                    models.append(model)
+        n_decoys = max(
+            [len(names) for x in decoys.values() for names in x.values()], default=0
+        )
+        shape = (len(metrics), len(targets), len(models), n_decoys)
+        npy_file = f"{dataset}.{os.getpid()}.{os.urandom(4).hex()}.npy"
+        cube = np.lib.format.open_memmap(
+            os.path.join(self.npy_dir, npy_file),
+            mode="w+",
+            dtype=np.float32,
+            shape=shape,
+        )
+        cube[:] = np.nan
+        for target_index, target in enumerate(targets):
+            df = dfs[target].reindex(columns=metrics)
+            model_index = np.array(
+                [models.index(get_model_from_decoy(x)) for x in df.index], dtype=int
+            )
+            # Position of each decoy among the decoys of its model
+            decoy_index = pd.Series(model_index).groupby(model_index).cumcount()
+            cube[:, target_index, model_index, decoy_index.to_numpy()] = df.to_numpy(
+                dtype=np.float32, na_value=np.nan
+            ).T
+        cube.flush()
+        del cube
+        labels = dict(
+            file=npy_file,
+            axes=AXES,
+            targets=targets,
+            models=models,
+            metrics=metrics,
+            decoys=decoys,
+            mtimes=mtimes,
+        )
+        tmp_path = f"{self._json_path(dataset)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(labels, file)
+        os.replace(tmp_path, self._json_path(dataset))
+        # Remove the previous cubes, and those of the exports that have crashed
+        for path in glob.glob(os.path.join(self.npy_dir, f"{dataset}.*.npy")):
+            if os.path.basename(path) != npy_file:
+                os.remove(path)
+        return shape
+
+    def export_folder(self, dataset: str, csv_folder: str) -> bool:
+        """
+        Export the .csv files of a dataset folder if one of them has been added,
+        removed or changed since the last export (or if the cube was written with
+        another order of the axes).
+        The processes that start at the same time wait for the first export
+        instead of writing the same cube.
+        :return: whether the cube has been written
+        """
+        files = sorted(x for x in os.listdir(csv_folder) if x.endswith(".csv"))
+        mtimes = {
+            x.replace(".csv", ""): os.stat(os.path.join(csv_folder, x)).st_mtime_ns
+            for x in files
+        }
+        with self._lock(dataset):
+            labels = self.read_labels(dataset)
+            if labels.get("mtimes") == mtimes and labels.get("axes") == AXES:
+                return False
+            dfs = {
+                x.replace(".csv", ""): pd.read_csv(
+                    os.path.join(csv_folder, x), index_col=[0]
+                )
+                for x in files
+            }
+            self._export(dataset, dfs, mtimes=mtimes)
+        return True
+
+    def open(self, dataset: str, n_tries: int = 3) -> Tuple[np.ndarray, Dict]:
+        """
+        Open the cube of a dataset as a read-only memory map.
+        :param n_tries: number of attempts, if the cube is replaced in between
+        :return: the cube and its labels (targets, models, metrics and decoys)
+        """
+        for n_try in range(n_tries):
+            labels = self.read_labels(dataset)
+            try:
+                cube = np.load(
+                    os.path.join(self.npy_dir, labels["file"]), mmap_mode="r"
+                )
+                return cube, labels
+            except FileNotFoundError:
+                if n_try == n_tries - 1:
+                    raise
+        raise FileNotFoundError(dataset)
+
+    def get_metric(self, dataset: str, metric: str, decoy: int = 0) -> pd.DataFrame:
+        """
+        Return the scores of a metric for one decoy of each (target, model).
+        :return: dataframe with the targets as index and the models as columns
+            (empty if the metric is not in the cube)
+        """
+        cube, labels = self.open(dataset)
+        if metric not in labels["metrics"] or decoy >= cube.shape[3]:
+            return pd.DataFrame(index=labels["targets"], columns=labels["models"])
+        # View of the cube: only the pages of this metric are read from the disk
+        values = cube[labels["metrics"].index(metric), :, :, decoy]
+        return pd.DataFrame(values, index=labels["targets"], columns=labels["models"])
+
+
+if __name__ == "__main__":
+    score_cube = ScoreCube()
+    for dataset in ["RNA_PUZZLES", "RNASOLO", "CASP_RNA"]:
+        csv_folder = os.path.join("docker_data", "output", dataset)
+        score_cube.export_folder(dataset, csv_folder)
+        cube, labels = score_cube.open(dataset)
+        print(f"{dataset}: {' x '.join(map(str, cube.shape))} ({' x '.join(AXES)})")
@@ -61,6 +61,22 @@ ALL_MODELS = [
 ASC_METRICS = ["INF-ALL", "TM-score", "GDT-TS", "lDDT"]
 # Lower is better
 DESC_METRICS = ["RMSD", "P-VALUE", "DI", "εRMSD", "MCQ"]
+# Direction of all the metrics computed by RNAdvisor (names of the .csv files)
+ASC_METRICS_ALL = ASC_METRICS + [
+    "INF-WC",
+    "INF-NWC",
+    "INF-STACK",
+    "GDT-TS@1",
+    "GDT-TS@2",
+    "GDT-TS@4",
+    "GDT-TS@8",
+    "BARNABA-eSCORE",
+    "CAD",
+    "QS-score",
+    "LCS-TA-COVERAGE",
+    "LCS-TA-RESIDUES",
+]
+DESC_METRICS_ALL = DESC_METRICS + ["BARNABA-eRMSD", "BARNABA-RMSD", "CLASH"]
 PAPER_METRICS = [
     "RMSD",
     "MCQ",
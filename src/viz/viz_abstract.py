@@ -1,9 +1,14 @@
 import os
-from typing import Dict
+from typing import Dict, Optional
 
 import numpy as np
 import pandas as pd
 
+from src.utils.aggregate_cube import AggregateCube
+from src.utils.disk_cache import DiskCache, hash_files, make_key
+from src.utils.model_ranking import ModelRanking
+from src.utils.results_db import ResultsDB
+from src.utils.score_cube import ScoreCube
 from src.viz.enum import (
     MODELS,
     MODELS_TO_GROUP,
@@ -15,16 +20,65 @@ from src.viz.enum import (
 )
 
 
+def read_dfs(
+    csv_folder: str, benchmark: str, db_path: Optional[str] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Read the scores of each RNA, either from the .csv files or from the database.
+    :return: dictionary with the RNA name and the scores (one row per prediction)
+    """
+    if db_path is not None:
+        return ResultsDB(db_path).read_dataset(benchmark)
+    dfs = {}
+    for csv_file in os.listdir(csv_folder):
+        if csv_file.endswith(".csv"):
+            rna_name = csv_file.replace(".csv", "")
+            csv_path = os.path.join(csv_folder, csv_file)
+            dfs[rna_name] = pd.read_csv(csv_path, index_col=[0])
+    return dfs
+
+
 class VizAbstract:
-    def __init__(self, csv_folder: str, benchmark: str):
+    def __init__(
+        self,
+        csv_folder: str,
+        benchmark: str,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        scores_df: Optional[pd.DataFrame] = None,
+        npy_dir: Optional[str] = None,
+        cache: Optional[DiskCache] = None,
+        dfs: Optional[Dict[str, pd.DataFrame]] = None,
+    ):
         """
 
         :param csv_folder: folder to the csv files with the different metrics
         :param benchmark: either "RNA_PUZZLES", "CASP_RNA" or "RNASOLO"
+        :param db_path: path to a results database (see ResultsDB) to read the
+            scores from instead of the csv files
+        :param cube_dir: folder of the precomputed aggregates (see AggregateCube)
+            used for the summary table
+        :param scores_df: scores already read and cleaned (by _get_df_clean), to
+            share one ingestion between the different visualisations
+        :param npy_dir: folder of the memory-mapped score cubes (see ScoreCube) to
+            slice the heatmaps and box plots from
+        :param cache: disk cache of the cleaned scores and of the rendered images,
+            shared by the visualisations of a run to count its hits and misses
+        :param dfs: scores already read (output of _read_dfs), to clean them
+            without reading the csv files again
         """
         self.csv_folder = csv_folder
         self.benchmark = benchmark
-        self.scores_df = self._get_df_clean(csv_folder)
+        self.db_path = db_path
+        self.cube_dir = cube_dir
+        self.npy_dir = npy_dir
+        self.dfs = dfs
+        self.cache = cache
+        if npy_dir is not None:
+            ScoreCube(npy_dir).export_folder(benchmark, csv_folder)
+        self.scores_df = (
+            scores_df if scores_df is not None else self._get_df_clean(csv_folder)
+        )
         self.save_path_dir = os.path.join("docker_data", "plots")
         self.plot_type = None  # To be completed by the subclasses
         self.rna_names = NAMES_TO_BENCHMARK.get(benchmark, None)
@@ -43,6 +97,26 @@ class VizAbstract:
         :param csv_folder:
         :return:
         """
+        if self.cache is None or self.db_path is not None:
+            return self.get_df_clean_from_dfs(self._read_dfs(csv_folder))
+        csv_paths = [
+            os.path.join(csv_folder, x)
+            for x in os.listdir(csv_folder)
+            if x.endswith(".csv")
+        ]
+        key = make_key("scores_df", self.benchmark, hash_files(csv_paths))
+        scores_df = self.cache.get(key)
+        if scores_df is None:
+            scores_df = self.get_df_clean_from_dfs(self._read_dfs(csv_folder))
+            self.cache.set(key, scores_df)
+        return scores_df
+
+    def get_df_clean_from_dfs(self, dfs: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """
+        Prepare dataframe to plotly format from already read scores.
+        :param dfs: dictionary with the RNA name and the scores (one row per prediction)
+        :return:
+        """
         scores_df: Dict = {
             "RNA_name": [],
             "Metric": [],
@@ -50,19 +124,24 @@ class VizAbstract:
             "Model": [],
             "Full_path": [],
         }
-        for csv_file in os.listdir(csv_folder):
-            if csv_file.endswith(".csv"):
-                df = pd.read_csv(os.path.join(csv_folder, csv_file), index_col=[0])
-                df = self._get_model_name(df)
-                rna_name = csv_file.replace(".csv", "")
-                for metric in df.columns:
-                    if metric != "Model":
-                        scores_df["RNA_name"].extend(len(df) * [rna_name])
-                        scores_df["Metric"].extend(df[metric].values)
-                        scores_df["Metric_name"].extend(len(df) * [metric])  # type: ignore
-                        scores_df["Model"].extend(df["Model"].values)
-                        scores_df["Full_path"].extend(df.index)
+        for rna_name, df in dfs.items():
+            df = self._get_model_name(df)
+            for metric in df.columns:
+                if metric != "Model":
+                    scores_df["RNA_name"].extend(len(df) * [rna_name])
+                    scores_df["Metric"].extend(df[metric].values)
+                    scores_df["Metric_name"].extend(len(df) * [metric])  # type: ignore
+                    scores_df["Model"].extend(df["Model"].values)
+                    scores_df["Full_path"].extend(df.index)
         scores_df = pd.DataFrame(scores_df)
+        return self._clean_scores(scores_df)
+
+    def _clean_scores(self, scores_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rename the models and metrics, add the category and clean some values
+        :param scores_df: dataframe with the RNA_name, Metric, Metric_name and Model
+        :return:
+        """
         scores_df = self._change_name(scores_df)
         scores_df = self.add_category(scores_df)
         mask = (
@@ -74,6 +153,16 @@ class VizAbstract:
         scores_df.loc[mask, "Metric"] = 200
         return scores_df
 
+    def _read_dfs(self, csv_folder: str) -> Dict[str, pd.DataFrame]:
+        """
+        Read the scores of each RNA, either from the .csv files or from the database.
+        :param csv_folder:
+        :return: dictionary with the RNA name and the scores (one row per prediction)
+        """
+        if self.dfs is not None:
+            return self.dfs
+        return read_dfs(csv_folder, self.benchmark, self.db_path)
+
     def _change_name(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Change the name of the models and some metrics
@@ -84,6 +173,27 @@ class VizAbstract:
             df = df.replace(old_value, new_value)
         return df
 
+    def _get_metric_from_npy(self, metric: str) -> pd.DataFrame:
+        """
+        Slice the scores of a metric for the first decoy of each model from the
+        score cube, with the names and cleaning of scores_df.
+        :param metric: name of the metric in scores_df (e.g. εRMSD)
+        :return: dataframe with the RNA names as index and the models as columns
+        """
+        score_cube = ScoreCube(self.npy_dir)
+        if metric not in score_cube.read_labels(self.benchmark)["metrics"]:
+            new_to_old = {new: old for old, new in OLD_TO_NEW.items()}
+            metric = new_to_old.get(metric, metric)
+        df = score_cube.get_metric(self.benchmark, metric)
+        df = df.rename(index=OLD_TO_NEW, columns=OLD_TO_NEW).astype(float)
+        metric = OLD_TO_NEW.get(metric, metric)
+        if metric in ["INF-ALL", "DI"] and "epRNA" in df.columns:
+            df["epRNA"] = np.nan
+        if metric == "DI":
+            df = df.clip(upper=200)
+        df.index.name, df.columns.name = "RNA_name", "Model"
+        return df
+
     def _get_model_name(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Get the model names and keep only the one row per model, the one with the best RMSD score
@@ -102,8 +212,20 @@ class VizAbstract:
         df["Model"] = new_model_names
         return df
 
+    def _get_best_scores(self) -> pd.DataFrame:
+        """
+        Return the scores of the best prediction of each model for each RNA,
+        from the precomputed aggregates if available.
+        """
+        if self.cube_dir is None:
+            return self.scores_df
+        cube = AggregateCube(self.cube_dir)
+        cube.update(self.benchmark, self.csv_folder)
+        return self._clean_scores(cube.get_first_values(self.benchmark))
+
     def summary_all_table(self):
-        scores_df = self.scores_df[self.scores_df["Model"].isin(MODELS)]
+        scores_df = self._get_best_scores()
+        scores_df = scores_df[scores_df["Model"].isin(MODELS)]
         df = (
             scores_df[["Metric", "Metric_name", "Model"]]
             .groupby(["Metric_name", "Model"], as_index=False)
@@ -118,33 +240,23 @@ class VizAbstract:
         pivot_df.to_csv(save_path)
         return pivot_df
 
-    def _clean_fig(self, fig):
-        fig.update_annotations(font_size=10)
-        params_axes = dict(
-            showgrid=True,
-            gridcolor="grey",
-            linecolor="black",
-            zeroline=False,
-            linewidth=1,
-            showline=True,
-            mirror=True,
-            gridwidth=1,
-            griddash="dot",
-            tickson="boundaries",
-        )
-        fig.update_yaxes(**params_axes)
-        fig.update_xaxes(**params_axes)
-        fig.update_layout(
-            dict(plot_bgcolor="white"), margin=dict(l=10, r=5, b=10, t=20)
-        )
-        param_marker = dict(
-            opacity=1, line=dict(width=0.5, color="DarkSlateGrey"), size=6
-        )
-        fig.update_traces(marker=param_marker, selector=dict(mode="markers"))
-        fig.update_layout(
-            font=dict(
-                family="Computer Modern",
-                size=10,  # Set the font size here
+    def ranking_tables(self) -> Dict[str, pd.DataFrame]:
+        """
+        Save, next to the summary table, the rank of each model on each target,
+        its rank averaged over the targets and the number of targets it wins.
+        :return: dictionary with the name and the dataframe of each table
+        """
+        scores_df = self._get_best_scores()
+        model_ranking = ModelRanking(scores_df[scores_df["Model"].isin(MODELS)])
+        models = [model for model in ORDER_MODELS if model in model_ranking.models]
+        tables = {
+            "target_ranks": model_ranking.get_target_ranks(),
+            "ranks": model_ranking.get_mean_ranks().loc[models],
+            "wins": model_ranking.get_wins().loc[models],
+        }
+        for name, df in tables.items():
+            save_path = os.path.join(
+                self.save_path_dir, "table", f"{self.benchmark}_{name}.csv"
             )
-        )
-        return fig
+            df.to_csv(save_path)
+        return tables
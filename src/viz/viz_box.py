@@ -1,8 +1,11 @@
 import os
-from typing import List, Any
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.subplots as sp
 
 from src.viz.enum import (
     PAPER_METRICS,
@@ -13,6 +16,13 @@ from src.viz.enum import (
     MODELS,
 )
 from src.viz.viz_abstract import VizAbstract
+from src.viz.viz_export import MAX_POINTS, write_fig
+from src.viz.viz_style import (
+    BOX_TEMPLATE,
+    apply_style,
+    get_annotations,
+    get_axes_layout,
+)
 
 
 class VizBox(VizAbstract):
@@ -21,109 +31,249 @@ class VizBox(VizAbstract):
         self.plot_type = "boxplot"
         self.save_path_full = os.path.join(self.save_path_dir, self.plot_type)
 
-    def box_plot_by_method(self):
-        self._box_plot_by_method(width=1200, height=600)
+    def box_plot_by_method(
+        self, from_stats: bool = False, html: bool = False, max_points: int = MAX_POINTS
+    ):
+        """
+        :param from_stats: build the boxes from precomputed quartiles instead of
+            sending all the scores to plotly (constant figure size)
+        :param html: save an interactive html page instead of a png
+        :param max_points: above this number of scores, the html page is built
+            from the quartiles
+        """
+        self._box_plot_by_method(
+            width=1200,
+            height=600,
+            from_stats=from_stats,
+            html=html,
+            max_points=max_points,
+        )
 
     def _box_plot_by_method(
         self,
         width: int = 1200,
         height: int = 800,
         legend_coordinates=(0.43, -0.25),
+        from_stats: bool = False,
+        html: bool = False,
+        max_points: int = MAX_POINTS,
     ):
         metrics = PAPER_METRICS
         df = self._get_df_box_plot_ready(metrics=metrics)
         df = df.rename(columns={"Category": "Method"}).replace({"INF-ALL": "INF"})
         if "casp" in self.benchmark.lower():
             df = df[df["Model"] != "MC-Sym"]
-        fig = px.box(
-            df,
-            x="Model",
-            y="Metric",
-            color="Method",
-            facet_col="Metric_name",
-            facet_col_wrap=3,
-            facet_row_spacing=0.06,
-            facet_col_spacing=0.05,
-            color_discrete_map=COLORS,
-            category_orders={
-                "Model": ORDER_MODELS,
-                "Metric_name": [x.replace("INF-ALL", "INF") for x in metrics],
-            },
-        )
-        fig = self._update_fig_box_plot(
+        metric_names = [x.replace("INF-ALL", "INF") for x in metrics]
+        if from_stats or (html and len(df) > max_points):
+            fig = self._get_box_fig_from_stats(df, metric_names, webgl=html)
+        else:
+            fig = px.box(
+                df,
+                x="Model",
+                y="Metric",
+                color="Method",
+                facet_col="Metric_name",
+                facet_col_wrap=3,
+                facet_row_spacing=0.06,
+                facet_col_spacing=0.05,
+                color_discrete_map=COLORS,
+                category_orders={"Model": ORDER_MODELS, "Metric_name": metric_names},
+            )
+        layout = self._get_layout_box_plot(
             fig, is_complete=False, legend_coordinates=legend_coordinates
         )
-        fig.update_xaxes(showticklabels=True)
-        fig.update_traces(width=0.3)
         for data in fig.data:
             data["marker"] = dict(color="#000000", opacity=1, size=8)
-        for cat, color in COLORS.items():
-            fig.update_traces(fillcolor=color, selector=dict(name=cat))
-        for col in range(1, 4):
-            fig.update_xaxes(showticklabels=False, row=3, col=col)
-            fig.update_xaxes(showticklabels=False, row=4, col=col)
-        fig.update_xaxes(showticklabels=False, row=2, col=1)
+            if data.type == "box":
+                data["width"] = 0.3
+            if data.name in COLORS:
+                data["fillcolor"] = COLORS[data.name]
+        fig = apply_style(fig, BOX_TEMPLATE, layout)
         save_path = os.path.join(self.save_path_full, f"{self.benchmark}_box.png")
-        fig.write_image(save_path, scale=2, width=width, height=height)
+        write_fig(
+            fig,
+            save_path,
+            html=html,
+            cache=self.cache,
+            scale=2,
+            width=width,
+            height=height,
+        )
+
+    def get_box_stats(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Compute the box plot statistics per (Metric_name, Model), the same way as
+        plotly (quartiles interpolated at position p * n - 0.5 of the sorted values).
+        :param df: dataframe with the Metric, Metric_name, Model and Method columns
+        :return: the statistics (q1, median, q3, lowerfence, upperfence, Method)
+            and the outliers (rows of df outside of the fences)
+        """
+        keys = ["Metric_name", "Model"]
+        df = df.dropna(subset=["Metric"]).sort_values(keys + ["Metric"])
+        values = df["Metric"].to_numpy(dtype=float)
+        grouped = df.groupby(keys, sort=False)
+        sizes = grouped.size()
+        starts = np.concatenate([[0], np.cumsum(sizes.to_numpy())[:-1]])
+        n = sizes.to_numpy()
+        stats = pd.DataFrame(index=sizes.index)
+        for name, quantile in [("q1", 0.25), ("median", 0.5), ("q3", 0.75)]:
+            position = np.clip(quantile * n - 0.5, 0, n - 1)
+            low, high = np.floor(position).astype(int), np.ceil(position).astype(int)
+            ratio = position - low
+            stats[name] = (1 - ratio) * values[starts + low] + ratio * values[
+                starts + high
+            ]
+        iqr = stats["q3"] - stats["q1"]
+        bounds = pd.DataFrame(
+            {"low": stats["q1"] - 1.5 * iqr, "high": stats["q3"] + 1.5 * iqr}
+        )
+        df = df.join(bounds, on=keys)
+        is_inside = (df["Metric"] >= df["low"]) & (df["Metric"] <= df["high"])
+        inside = df[is_inside].groupby(keys)["Metric"]
+        stats["lowerfence"] = np.minimum(stats["q1"], inside.min())
+        stats["upperfence"] = np.maximum(stats["q3"], inside.max())
+        stats["Method"] = grouped["Method"].first()
+        return stats.reset_index(), df.loc[~is_inside, keys + ["Metric", "Method"]]
+
+    def _get_box_fig_from_stats(
+        self, df: pd.DataFrame, metric_names: List, n_col: int = 3, webgl: bool = False
+    ) -> go.Figure:
+        """
+        Build the box plot figure from the precomputed statistics, with the same
+        layout as px.box with facet_col_wrap.
+        :param webgl: draw the outliers with WebGL (for the interactive pages)
+        """
+        scatter = go.Scattergl if webgl else go.Scatter
+        stats, outliers = self.get_box_stats(df)
+        metric_names = [x for x in metric_names if x in set(stats["Metric_name"])]
+        n_row = int(np.ceil(len(metric_names) / n_col))
+        positions = {
+            metric: (n_row - index // n_col, index % n_col + 1)
+            for index, metric in enumerate(metric_names)
+        }
+        fig = sp.make_subplots(
+            rows=n_row,
+            cols=n_col,
+            start_cell="bottom-left",
+            horizontal_spacing=0.05,
+            vertical_spacing=0.06,
+        )
+        for metric, (row, col) in positions.items():
+            subplot = fig.get_subplot(row, col)
+            domain_x, domain_y = subplot.xaxis.domain, subplot.yaxis.domain
+            fig.add_annotation(
+                text=metric,
+                x=(domain_x[0] + domain_x[1]) / 2,
+                y=domain_y[1],
+                xref="paper",
+                yref="paper",
+                xanchor="center",
+                yanchor="bottom",
+                showarrow=False,
+            )
+        # Same order of the legend as px.box: order of appearance in df
+        for method in df["Method"].dropna().unique():
+            for index, metric in enumerate(metric_names):
+                row, col = positions[metric]
+                c_stats = stats[
+                    (stats["Method"] == method) & (stats["Metric_name"] == metric)
+                ]
+                c_outliers = outliers[
+                    (outliers["Method"] == method) & (outliers["Metric_name"] == metric)
+                ]
+                trace_params = dict(name=method, legendgroup=method)
+                box = go.Box(
+                    x=c_stats["Model"],
+                    q1=c_stats["q1"],
+                    median=c_stats["median"],
+                    q3=c_stats["q3"],
+                    lowerfence=c_stats["lowerfence"],
+                    upperfence=c_stats["upperfence"],
+                    marker_color=COLORS.get(method),
+                    alignmentgroup="True",
+                    showlegend=index == 0,
+                    offsetgroup=method,
+                    **trace_params,
+                )
+                points = scatter(
+                    x=c_outliers["Model"],
+                    y=c_outliers["Metric"],
+                    mode="markers",
+                    showlegend=False,
+                    **trace_params,
+                )
+                if not webgl:
+                    # Scattergl has no offset: its points stay at the category center
+                    points.offsetgroup = method
+                fig.add_trace(box, row=row, col=col)
+                fig.add_trace(points, row=row, col=col)
+        xaxis = dict(matches="x", categoryorder="array", categoryarray=ORDER_MODELS)
+        axes = {
+            (row, col): (xaxis, None)
+            for row in range(1, n_row + 1)
+            for col in range(1, n_col + 1)
+        }
+        fig.update_layout(
+            **get_axes_layout(fig, axes), boxmode="group", legend_title_text="Method"
+        )
+        return fig
 
     def _get_df_box_plot_ready(self, metrics: List = SUB_METRICS) -> pd.DataFrame:
         """Return the df used for box plots"""
+        if self.npy_dir is not None:
+            return self._get_df_box_plot_from_npy(metrics)
         df = self.scores_df[self.scores_df["Metric_name"].isin(metrics)]
         # Take only the best model for each RNA
         df = df[df["Model"].isin(MODELS)]
         return df
 
-    def _update_fig_box_plot(
-        self, fig: Any, is_complete: bool = True, legend_coordinates=(0.43, -0.25)
-    ) -> Any:
-        fig.update_yaxes(matches=None, showticklabels=True)
-        params_axes = dict(
-            showgrid=True,
-            gridcolor="#d6d6d6",
-            linecolor="black",
-            zeroline=False,
-            linewidth=1,
-            showline=True,
-            mirror=True,
-            gridwidth=1,
-            griddash="dot",
-            title=None,
-        )
-        fig.update_xaxes(**params_axes)
-        fig.update_yaxes(**params_axes)
-        fig.update_xaxes(
-            tickangle=45,
-        )
-        fig.update_layout(dict(plot_bgcolor="white"), margin=dict(l=0, r=5, b=0, t=20))
-        param_marker = dict(
-            opacity=1, line=dict(width=0.5, color="DarkSlateGrey"), size=6
-        )
-        fig.update_traces(marker=param_marker, selector=dict(mode="markers"))
-        for annotation in fig["layout"]["annotations"]:
-            annotation["text"] = annotation["text"].replace("Metric_name=", "")
-        fig.update_layout(
-            font=dict(
-                family="Computer Modern",
-                size=18,  # Set the font size here
-            )
-        )
-        fig.update_layout(
-            legend=dict(
-                orientation="v",
-                bgcolor="#f3f3f3",
-                bordercolor="Black",
-                borderwidth=1,
-            ),
-        )
-        fig.update_xaxes(visible=True, showticklabels=False)
+    def _get_df_box_plot_from_npy(self, metrics: List) -> pd.DataFrame:
+        """
+        Return the df used for box plots, sliced from the score cube.
+        """
+        dfs = []
+        for metric in metrics:
+            df = self._get_metric_from_npy(metric)
+            df = df[[x for x in MODELS if x in df.columns]].reset_index()
+            df = df.melt(id_vars="RNA_name", var_name="Model", value_name="Metric")
+            dfs.append(df.dropna(subset=["Metric"]).assign(Metric_name=metric))
+        return self.add_category(pd.concat(dfs, ignore_index=True))
+
+    def _get_layout_box_plot(
+        self,
+        fig: Any,
+        n_col: int = 3,
+        is_complete: bool = True,
+        legend_coordinates=(0.43, -0.25),
+    ) -> Dict:
+        """
+        Return the layout of the box plot grid (the style is in BOX_TEMPLATE).
+        The subplots are filled from the top left corner and the models are only
+        written under the last subplot of each column.
+        :param fig: box plot with one subplot (and one title) per metric
+        """
+        n_metrics = len(fig.layout.annotations)
+        n_row = int(np.ceil(n_metrics / n_col))
+        axes = {}
+        for row in range(1, n_row + 1):
+            for col in range(1, n_col + 1):
+                # Rows are numbered from the bottom of the figure
+                index = (n_row - row) * n_col + col - 1
+                xaxis = dict(title=None, showticklabels=index + n_col >= n_metrics)
+                yaxis = dict(title=None, matches=None, showticklabels=True)
+                axes[(row, col)] = (xaxis, yaxis)
+        legend = dict(orientation="v")
         if not is_complete:
-            fig.update_layout(
-                legend=dict(
-                    yanchor="top",
-                    xanchor="right",
-                    x=legend_coordinates[0],
-                    y=legend_coordinates[1],
-                    orientation="h",
-                ),
+            legend = dict(
+                yanchor="top",
+                xanchor="right",
+                x=legend_coordinates[0],
+                y=legend_coordinates[1],
+                orientation="h",
             )
-        return fig
+        return dict(
+            **get_axes_layout(fig, axes),
+            annotations=get_annotations(fig, replace={"Metric_name=": ""}),
+            margin=dict(l=0, r=5, b=0, t=20),
+            legend=legend,
+        )
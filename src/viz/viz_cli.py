@@ -1,40 +1,230 @@
+import argparse
 import os
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
+import pandas as pd
+
+from src.utils.disk_cache import CACHE_DIR, DiskCache
+from src.viz.viz_abstract import VizAbstract, read_dfs
 from src.viz.viz_box import VizBox
 from src.viz.viz_heat import VizHeat
 from src.viz.viz_polar import VizPolar
 
 
+def ingest_benchmark(
+    benchmark: str,
+    db_path: Optional[str] = None,
+    cube_dir: Optional[str] = None,
+    cache: Optional[DiskCache] = None,
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Read the results of a benchmark once for all the visualisations.
+    :return: the cleaned scores (for the box plots, heatmaps and tables) and the
+        mean scores per model of each RNA (for the polar plots, see
+        VizPolar.get_target_means)
+    """
+    csv_folder = os.path.join("docker_data", "output", benchmark)
+    dfs = read_dfs(csv_folder, benchmark, db_path)
+    scores_df = VizAbstract(
+        csv_folder, benchmark, db_path=db_path, cache=cache, dfs=dfs
+    ).scores_df
+    viz_polar = VizPolar({}, db_path=db_path, cube_dir=cube_dir)
+    return scores_df, viz_polar.get_target_means(csv_folder, dfs=dfs)
+
+
+def ingest_benchmark_counted(
+    benchmark: str,
+    db_path: Optional[str] = None,
+    cube_dir: Optional[str] = None,
+    cache: Optional[DiskCache] = None,
+) -> Tuple[Tuple[pd.DataFrame, Dict], Tuple[int, int]]:
+    """
+    Run ingest_benchmark in a child process, where the cache is a copy.
+    :return: the output of ingest_benchmark, and the hits and misses of the copy
+        of the cache, to be added to the cache of the parent process
+    """
+    if cache is None:
+        return ingest_benchmark(benchmark, db_path, cube_dir), (0, 0)
+    cache.hits, cache.misses = 0, 0
+    output = ingest_benchmark(benchmark, db_path, cube_dir, cache)
+    return output, (cache.hits, cache.misses)
+
+
 class VizCLI:
-    def __init__(self, csv_folder: str):
+    def __init__(
+        self,
+        csv_folder: str,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        npy_dir: Optional[str] = None,
+        cache: Optional[DiskCache] = None,
+    ):
         self.csv_folder = csv_folder
         self.benchmark = os.path.basename(csv_folder)
+        self.db_path = db_path
+        self.cube_dir = cube_dir
+        self.npy_dir = npy_dir
+        self.cache = cache
 
-    def run(self):
-        viz_box = VizBox(self.csv_folder, self.benchmark)
-        viz_box.box_plot_by_method()
-        viz_heat = VizHeat(self.csv_folder, self.benchmark)
-        viz_heat.plot_heatmaps()
+    def run(self, scores_df: Optional[pd.DataFrame] = None, html: bool = False):
+        viz_box = VizBox(
+            self.csv_folder,
+            self.benchmark,
+            db_path=self.db_path,
+            scores_df=scores_df,
+            npy_dir=self.npy_dir,
+            cache=self.cache,
+        )
+        viz_box.box_plot_by_method(html=html)
+        viz_heat = VizHeat(
+            self.csv_folder,
+            self.benchmark,
+            db_path=self.db_path,
+            cube_dir=self.cube_dir,
+            scores_df=viz_box.scores_df,
+            npy_dir=self.npy_dir,
+            cache=self.cache,
+        )
+        viz_heat.plot_heatmaps(html=html)
         viz_heat.summary_all_table()
+        viz_heat.ranking_tables()
+        viz_heat.plot_metric_correlations(html=html)
 
     @staticmethod
-    def run_benchmark(benchmark: str):
+    def run_benchmark(
+        benchmark: str,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        scores_df: Optional[pd.DataFrame] = None,
+        html: bool = False,
+        npy_dir: Optional[str] = None,
+        cache: Optional[DiskCache] = None,
+    ):
         csv_folder = os.path.join("docker_data", "output", benchmark)
-        viz_cli = VizCLI(csv_folder)
-        viz_cli.run()
+        viz_cli = VizCLI(
+            csv_folder,
+            db_path=db_path,
+            cube_dir=cube_dir,
+            npy_dir=npy_dir,
+            cache=cache,
+        )
+        viz_cli.run(scores_df=scores_df, html=html)
 
     @staticmethod
-    def run_all_benchmark(benchmarks: List):
+    def run_all_benchmark(
+        benchmarks: List,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        mean_scores: Optional[Dict] = None,
+        n_jobs: int = 1,
+        html: bool = False,
+        cache: Optional[DiskCache] = None,
+    ):
         in_paths = {
             name: os.path.join("docker_data", "output", name) for name in benchmarks
         }
-        viz_polar = VizPolar(in_paths)
-        viz_polar.viz()
+        viz_polar = VizPolar(
+            in_paths,
+            db_path=db_path,
+            cube_dir=cube_dir,
+            mean_scores=mean_scores,
+            n_jobs=n_jobs,
+            cache=cache,
+        )
+        viz_polar.viz(html=html)
+
+    @staticmethod
+    def ingest(
+        benchmarks: List,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        n_jobs: int = 1,
+        cache: Optional[DiskCache] = None,
+    ) -> Dict[str, Tuple[pd.DataFrame, Dict]]:
+        """
+        Read all the benchmarks, concurrently in a process pool if n_jobs > 1.
+        :return: dictionary with the benchmark and the output of ingest_benchmark
+        """
+        args = [(benchmark, db_path, cube_dir, cache) for benchmark in benchmarks]
+        if n_jobs > 1 and len(benchmarks) > 1:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(args))) as executor:
+                results = list(executor.map(ingest_benchmark_counted, *zip(*args)))
+            outputs = [output for output, _ in results]
+            if cache is not None:
+                cache.hits += sum(hits for _, (hits, _) in results)
+                cache.misses += sum(misses for _, (_, misses) in results)
+        else:
+            outputs = [ingest_benchmark(*arg) for arg in args]
+        return dict(zip(benchmarks, outputs))
+
+    @staticmethod
+    def run_all(
+        benchmarks: List,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        n_jobs: Optional[int] = None,
+        html: bool = False,
+        npy_dir: Optional[str] = None,
+        cache: Optional[DiskCache] = None,
+    ):
+        """
+        Run all the visualisations of all the benchmarks, reading each of them once.
+        :param n_jobs: number of processes to read the benchmarks, default to the
+            number of CPUs
+        :param html: save interactive html pages instead of png images
+        :param npy_dir: folder of the memory-mapped score cubes to slice the
+            heatmaps and box plots from
+        :param cache: disk cache of the cleaned scores and of the rendered images,
+            shared by all the visualisations (its hits and misses are counted
+            over the whole run)
+        """
+        n_jobs = n_jobs or os.cpu_count() or 1
+        ingested = VizCLI.ingest(benchmarks, db_path, cube_dir, n_jobs, cache)
+        for benchmark, (scores_df, _) in ingested.items():
+            VizCLI.run_benchmark(
+                benchmark,
+                db_path,
+                cube_dir,
+                scores_df=scores_df,
+                html=html,
+                npy_dir=npy_dir,
+                cache=cache,
+            )
+        viz_polar = VizPolar({}, db_path=db_path, cube_dir=cube_dir)
+        mean_scores = {
+            name: viz_polar.get_mean_metrics(
+                os.path.join("docker_data", "output", name), target_means=output[1]
+            )
+            for name, output in ingested.items()
+        }
+        VizCLI.run_all_benchmark(
+            benchmarks,
+            db_path,
+            cube_dir,
+            mean_scores=mean_scores,
+            html=html,
+            cache=cache,
+        )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="State-of-the-RNArt visualisations")
+    parser.add_argument(
+        "--html", action="store_true", help="Save interactive html pages"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help=f"Reuse the scores and images of the previous runs (in {CACHE_DIR})",
+    )
+    args = parser.parse_args()
     benchmarks = ["CASP_RNA", "RNA_PUZZLES", "RNASOLO"]
-    for benchmark in benchmarks:
-        VizCLI.run_benchmark(benchmark)
-    VizCLI.run_all_benchmark(benchmarks)
+    cache = DiskCache(CACHE_DIR) if args.cache else None
+    VizCLI.run_all(benchmarks, html=args.html, cache=cache)
+    if cache is not None:
+        stats = cache.stats()
+        print(
+            f"Cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['entries']} entries, {stats['bytes'] / 1024**2:.1f} MB"
+        )
@@ -0,0 +1,44 @@
+import json
+import os
+from typing import Any, Optional
+
+from src.utils.disk_cache import DiskCache, make_key
+
+# Above this number of points, the interactive figures are aggregated
+MAX_POINTS = 50000
+
+
+def write_fig(
+    fig: Any,
+    save_path: str,
+    html: bool = False,
+    cache: Optional[DiskCache] = None,
+    **kwargs,
+):
+    """
+    Save a figure, either as a static image or as an interactive html page.
+    The html pages do not embed plotly.js: a single plotly.min.js bundle is
+    written in the output directory and shared by all its pages.
+    :param fig: plotly figure
+    :param save_path: path of the image (".png" is replaced by ".html" if html)
+    :param html: whether to save an interactive html page
+    :param cache: cache of the rendered images, keyed by the figure and the
+        parameters, to skip the rendering of the figures that have not changed
+    :param kwargs: parameters of write_image (scale, width, height)
+    """
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    if not html and cache is None:
+        fig.write_image(save_path, **kwargs)
+        return
+    if not html:
+        image_format = os.path.splitext(save_path)[1][1:]
+        key = make_key("image", image_format, fig.to_json(), json.dumps(kwargs))
+        image = cache.get_bytes(key)
+        if image is None:
+            image = fig.to_image(format=image_format, **kwargs)
+            cache.set_bytes(key, image)
+        with open(save_path, "wb") as file:
+            file.write(image)
+        return
+    save_path = os.path.splitext(save_path)[0] + ".html"
+    fig.write_html(save_path, include_plotlyjs="directory", full_html=True)
@@ -1,6 +1,10 @@
 import os
-from typing import List, Any
+from typing import Dict, List, Tuple
 
+import numpy as np
+import pandas as pd
+
+from src.utils.metric_correlation import MetricCorrelation
 from src.viz.enum import (
     ASC_METRICS,
     MODELS,
@@ -9,6 +13,13 @@ from src.viz.enum import (
     PAPER_METRICS,
 )
 from src.viz.viz_abstract import VizAbstract
+from src.viz.viz_export import MAX_POINTS, write_fig
+from src.viz.viz_style import (
+    HEATMAP_TEMPLATE,
+    apply_style,
+    get_annotations,
+    get_axes_layout,
+)
 import plotly.subplots as sp
 import plotly.graph_objects as go
 
@@ -19,10 +30,12 @@ class VizHeat(VizAbstract):
         self.plot_type = "heatmap"
         self.save_path_full = os.path.join(self.save_path_dir, self.plot_type)
 
-    def plot_heatmaps(self):
+    def plot_heatmaps(self, html: bool = False, max_points: int = MAX_POINTS):
         """
         Plot the heatmap visualiation
-        :param name: Name of the benchmark
+        :param html: save an interactive html page instead of a png
+        :param max_points: above this number of cells, the RNAs of the html page
+            are averaged by groups of consecutive lengths
         :return:
         """
         positions = [
@@ -37,27 +50,9 @@ class VizHeat(VizAbstract):
             (0.9999, 0.365),
             (0.315, 0.1),
         ]
-        self.plot_heatmap_t_paper(positions, width=2600, height=2000)
-
-    def _update_axes_heatmap(self, fig: Any, row, col):
-        fig.update_xaxes(
-            row=row,
-            col=col,
-            showline=True,
-            showticklabels=True,
-            tickfont=dict(size=20),
-            tickangle=90,
+        self.plot_heatmap_t_paper(
+            positions, width=2600, height=2000, html=html, max_points=max_points
         )
-        fig.update_yaxes(
-            row=row,
-            col=col,
-            showline=True,
-            showticklabels=True,
-            nticks=len(self.rna_names),
-            tickangle=0,
-            tickfont=dict(size=20),
-        )
-        return fig
 
     def convert_heatmap(self, heatmaps: List):
         """
@@ -73,25 +68,26 @@ class VizHeat(VizAbstract):
                 continue
         return new_heatmaps
 
-    def _update_axes_heatmap(self, fig: Any, row, col):
-        fig.update_xaxes(
-            row=row,
-            col=col,
+    def _get_axes_heatmap(self, row: int, col: int, n_row: int) -> Tuple[Dict, Dict]:
+        """
+        Return the x and y axes of a heatmap of the grid (0-indexed row and col).
+        Only the first column shows the models and the last row (or the last
+        filled one) shows the RNAs.
+        """
+        xaxis = dict(
             showline=True,
-            showticklabels=True,
+            showticklabels=row == n_row - 1 or (col != 0 and row == n_row - 2),
             tickfont=dict(size=20),
             tickangle=90,
         )
-        fig.update_yaxes(
-            row=row,
-            col=col,
+        yaxis = dict(
             showline=True,
-            showticklabels=True,
+            showticklabels=col == 0,
             nticks=len(self.rna_lengths),
             tickangle=0,
             tickfont=dict(size=20),
         )
-        return fig
+        return xaxis, yaxis
 
     def plot_heatmap_t_paper(
         self,
@@ -102,6 +98,8 @@ class VizHeat(VizAbstract):
         width=3000,
         height=800,
         horizontal_spacing=0.03,
+        html: bool = False,
+        max_points: int = MAX_POINTS,
     ):
         metrics = PAPER_METRICS
         fig = sp.make_subplots(
@@ -115,6 +113,7 @@ class VizHeat(VizAbstract):
         heatmaps = [
             x.T[self.rna_names] for x in heatmaps
         ]  # To select RNA challenges order
+        axes = {}
         for row in range(n_row):
             for col in range(n_col):
                 index = row * n_col + col
@@ -127,6 +126,10 @@ class VizHeat(VizAbstract):
                 columns = [
                     f"{rna} ({self.rna_lengths[rna]} nt)" for rna in data.columns
                 ]
+                if html:
+                    data, columns = self._downsample_heatmap(
+                        data, columns, max_points // len(heatmaps)
+                    )
                 heatmap = go.Heatmap(
                     z=data,
                     y=data.index,
@@ -146,23 +149,109 @@ class VizHeat(VizAbstract):
                     row=row + 1,
                     col=col + 1,
                 )
-                fig = self._update_axes_heatmap(fig, row + 1, col + 1)
-                if col != 0:
-                    fig.update_yaxes(showticklabels=False, row=row + 1, col=col + 1)
-                if row != n_row - 1:
-                    fig.update_xaxes(showticklabels=False, row=row + 1, col=col + 1)
-                if col != 0 and row == n_row - 2:
-                    fig.update_xaxes(showticklabels=True, row=row + 1, col=col + 1)
-
-        fig = self._clean_fig(fig)
-        fig.update_annotations(font_size=24)
-        fig.update_layout(
+                axes[(row + 1, col + 1)] = self._get_axes_heatmap(row, col, n_row)
+        layout = dict(
+            **get_axes_layout(fig, axes),
+            annotations=get_annotations(fig, font=dict(size=24)),
             margin=dict(l=20, r=20, t=50, b=20),
         )
+        fig = apply_style(fig, HEATMAP_TEMPLATE, layout)
         save_path = os.path.join(
             "docker_data", "plots", "heatmap", f"{self.benchmark}_heatmap.png"
         )
-        fig.write_image(save_path, scale=4, width=width, height=height)
+        write_fig(
+            fig,
+            save_path,
+            html=html,
+            cache=self.cache,
+            scale=4,
+            width=width,
+            height=height,
+        )
+
+    def plot_metric_correlations(self, html: bool = False):
+        """
+        Plot the Pearson and Spearman correlations and the ranking agreement
+        between all the metrics, over all the decoys of the benchmark.
+        The matrices are also saved as .csv files.
+        :param html: save an interactive html page instead of a png
+        """
+        metric_correlation = MetricCorrelation(self._read_dfs(self.csv_folder))
+        matrices = {
+            "Pearson": metric_correlation.pearson(),
+            "Spearman": metric_correlation.spearman(),
+            "Ranking agreement": metric_correlation.agreement(),
+        }
+        save_dir = os.path.join(self.save_path_dir, "correlation")
+        os.makedirs(save_dir, exist_ok=True)
+        fig = sp.make_subplots(
+            rows=1,
+            cols=len(matrices),
+            horizontal_spacing=0.1,
+            subplot_titles=list(matrices),
+        )
+        axes = {}
+        for col, (name, matrix) in enumerate(matrices.items(), start=1):
+            name = name.lower().replace(" ", "_")
+            matrix.to_csv(os.path.join(save_dir, f"{self.benchmark}_{name}.csv"))
+            domain = fig.get_subplot(1, col).xaxis.domain
+            heatmap = go.Heatmap(
+                z=matrix,
+                x=matrix.columns,
+                y=matrix.index,
+                colorbar=dict(x=domain[1] + 0.01, thickness=20, tickfont=dict(size=16)),
+                colorscale="RdBu",
+                # The agreement of two random rankings is 0.5
+                zmin=-1 if col < len(matrices) else 0,
+                zmax=1,
+            )
+            fig.add_trace(heatmap, row=1, col=col)
+            xaxis = dict(showline=True, tickangle=90, tickfont=dict(size=14))
+            yaxis = dict(
+                showline=True,
+                showticklabels=col == 1,
+                autorange="reversed",
+                tickfont=dict(size=14),
+            )
+            axes[(1, col)] = (xaxis, yaxis)
+        layout = dict(
+            **get_axes_layout(fig, axes),
+            annotations=get_annotations(fig, font=dict(size=24)),
+            margin=dict(l=20, r=20, t=50, b=20),
+        )
+        fig = apply_style(fig, HEATMAP_TEMPLATE, layout)
+        save_path = os.path.join(save_dir, f"{self.benchmark}_correlation.png")
+        write_fig(
+            fig,
+            save_path,
+            html=html,
+            cache=self.cache,
+            scale=2,
+            width=2400,
+            height=850,
+        )
+
+    def _downsample_heatmap(
+        self, data: pd.DataFrame, columns: List[str], max_cells: int
+    ) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Average consecutive RNAs (sorted by length) to keep at most max_cells cells.
+        :param data: heatmap with the models as index and the RNAs as columns
+        :param columns: labels of the RNAs
+        :return: the downsampled heatmap and its labels
+        """
+        if data.size <= max_cells:
+            return data, columns
+        n_groups = max(max_cells // max(len(data.index), 1), 1)
+        groups = np.arange(len(data.columns)) * n_groups // len(data.columns)
+        new_data = data.T.groupby(groups).mean().T
+        new_columns = [
+            f"{columns[np.argmax(groups == group)]} - "
+            f"{columns[len(groups) - 1 - np.argmax(groups[::-1] == group)]}"
+            for group in new_data.columns
+        ]
+        new_data.columns = new_columns
+        return new_data, new_columns
 
     def _get_heat_maps(self, metrics):
         heatmaps = []
@@ -171,6 +260,8 @@ class VizHeat(VizAbstract):
         return heatmaps
 
     def _get_heat_map(self, metric: str):
+        if self.npy_dir is not None:
+            return self._get_metric_from_npy(metric).reindex(columns=ORDER_MODELS)
         df = self.scores_df[self.scores_df["Metric_name"].isin(METRICS)]
         # Take only the best model for each RNA
         df = df[df["Model"].isin(MODELS)]
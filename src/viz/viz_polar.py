@@ -1,11 +1,17 @@
 import os
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
 
 import numpy as np
 import pandas as pd
 import plotly.express as px
 
+from src.utils.aggregate_cube import AggregateCube
+from src.utils.disk_cache import DiskCache
+from src.utils.results_db import ResultsDB
 from src.viz.enum import ALL_MODELS, OLD_TO_NEW, DESC_METRICS
+from src.viz.viz_export import write_fig
+from src.viz.viz_style import POLAR_TEMPLATE, apply_style
 from sklearn.preprocessing import MinMaxScaler
 
 SUB_METRICS = [
@@ -22,53 +28,48 @@ SUB_METRICS = [
 
 
 class VizPolar:
-    def __init__(self, in_paths: Dict):
-        self.df = self.read_df(in_paths)
-
-    def _clean_polar_viz(self, fig):
-        new_polars = {
-            "polar": dict(
-                radialaxis=dict(
-                    showline=False,
-                    showgrid=True,
-                    linewidth=0.5,
-                    linecolor="black",
-                    gridcolor="black",
-                    gridwidth=0.5,
-                    showticklabels=False,
-                ),
-                angularaxis=dict(
-                    linewidth=0.5,
-                    visible=True,
-                    linecolor="black",
-                    showline=True,
-                    gridcolor="black",
-                ),
-                radialaxis_tickfont_size=20,
-                bgcolor="white",
-            )
-        }
-        fig.update_layout(
-            legend=dict(
-                orientation="v",
-                bgcolor="white",
-                bordercolor="Black",
-                borderwidth=1,
-                font=dict(size=20),
-                x=1.3,
-                y=1.1,
-            ),
-        )
-        fig.update_layout(margin=dict(l=200, r=200, b=50, t=50))
-        fig.update_layout(font_size=28)
-        fig.update_layout(
-            **new_polars,
+    def __init__(
+        self,
+        in_paths: Dict,
+        db_path: Optional[str] = None,
+        cube_dir: Optional[str] = None,
+        mean_scores: Optional[Dict] = None,
+        n_jobs: int = 1,
+        cache: Optional[DiskCache] = None,
+    ):
+        """
+        :param in_paths: dictionary with the dataset name and the folder of .csv files
+        :param db_path: path to a results database (see ResultsDB) to read the
+            scores from instead of the csv files
+        :param cube_dir: folder of the precomputed aggregates (see AggregateCube)
+            to compute the means from, instead of the raw scores
+        :param mean_scores: mean scores (output of get_mean_metrics) already
+            computed for some datasets
+        :param n_jobs: number of processes to read the datasets concurrently
+        :param cache: disk cache of the rendered images, shared by the
+            visualisations of a run to count its hits and misses
+        """
+        self.db_path = db_path
+        self.cube_dir = cube_dir
+        self.n_jobs = n_jobs
+        self.cache = cache
+        self.df = self.read_df(in_paths, mean_scores)
+
+    def _get_layout_polar_viz(self) -> Dict:
+        """
+        Return the layout of the polar plots (the style is in POLAR_TEMPLATE).
+        """
+        return dict(
+            legend=dict(x=1.3, y=1.1),
+            margin=dict(l=200, r=200, b=50, t=50),
             showlegend=False,
         )
-        return fig
 
-    def viz_dataset(self, dataset: str):
-        """Plot the polar distribution for a dataset."""
+    def viz_dataset(self, dataset: str, html: bool = False):
+        """
+        Plot the polar distribution for a dataset.
+        :param html: save an interactive html page instead of a png
+        """
         colors = [
             "#e10000",
             "#656567",
@@ -86,19 +87,27 @@ class VizPolar:
             r="Metric (value)",
             theta="Model",
             color="Metric",
-            template="plotly_white",
+            template=POLAR_TEMPLATE,
             color_discrete_sequence=colors,
             range_r=[0, 9],
         )
-        fig = self._clean_polar_viz(fig)
+        fig = apply_style(fig, POLAR_TEMPLATE, self._get_layout_polar_viz())
         # Save the figure
         save_path = os.path.join("docker_data", "plots", "polar", dataset + ".png")
-        fig.write_image(save_path, scale=2, width=1000, height=800)
+        write_fig(
+            fig,
+            save_path,
+            html=html,
+            cache=self.cache,
+            scale=2,
+            width=1000,
+            height=800,
+        )
 
-    def viz(self):
+    def viz(self, html: bool = False):
         datasets = self.df["Dataset"].unique()
         for i, dataset in enumerate(datasets):
-            self.viz_dataset(dataset)
+            self.viz_dataset(dataset, html=html)
 
     def normalize_metrics(self, df, desc_metrics: List = DESC_METRICS):
         metrics, datasets = df["Metric"].unique(), df["Dataset"].unique()
@@ -115,13 +124,14 @@ class VizPolar:
             df.loc[mask, "Metric (value)"] = norm_metric
         return df
 
-    def read_df(self, in_paths: Dict):
+    def read_df(self, in_paths: Dict, mean_scores: Optional[Dict] = None):
         """
         Read the dataset results
         """
+        mean_scores = self.get_all_mean_metrics(in_paths, mean_scores)
         df = {"Metric": [], "Dataset": [], "Metric (value)": [], "Model": []}
-        for dataset, d_path in in_paths.items():
-            c_scores = self.get_mean_metrics(d_path)
+        for dataset in in_paths:
+            c_scores = mean_scores[dataset]
             for model, values in c_scores.items():
                 metric = list(values.values())
                 n = len(metric)
@@ -135,43 +145,149 @@ class VizPolar:
         df = df.replace(OLD_TO_NEW)
         return df
 
+    def get_all_mean_metrics(
+        self, in_paths: Dict, mean_scores: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Return the mean per metric of each dataset. The datasets are read
+        concurrently in a process pool, and only the means are sent back.
+        :param in_paths: dictionary with the dataset name and the folder of .csv files
+        :param mean_scores: mean scores already computed for some datasets
+        :return: dictionary with the dataset name and the output of get_mean_metrics
+        """
+        mean_scores = dict(mean_scores or {})
+        missing = {
+            dataset: d_path
+            for dataset, d_path in in_paths.items()
+            if dataset not in mean_scores
+        }
+        if self.n_jobs > 1 and len(missing) > 1:
+            n_workers = min(self.n_jobs, len(missing))
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                outputs = list(executor.map(self.get_mean_metrics, missing.values()))
+        else:
+            outputs = [self.get_mean_metrics(d_path) for d_path in missing.values()]
+        mean_scores.update(zip(missing.keys(), outputs))
+        return mean_scores
+
     def get_mean_metrics(
-        self, in_path: str, metrics: List = SUB_METRICS, models: List = ALL_MODELS
+        self,
+        in_path: str,
+        metrics: List = SUB_METRICS,
+        models: List = ALL_MODELS,
+        target_means: Optional[Dict] = None,
     ):
         """
         Return the mean per metric from a directory with .csv files
         :param in_path:
+        :param target_means: means of each RNA already computed (output of
+            get_target_means), to average them without reading the scores again
         :return:
         """
-        files = [x for x in os.listdir(in_path) if x.endswith(".csv")]
+        if target_means is not None:
+            targets = list(target_means)
+        else:
+            targets = self.get_targets(in_path)
         scores = {model: {metric: [] for metric in metrics} for model in models}
         if "casp" in in_path:
-            files = [
-                f"{x}.csv"
-                for x in [
-                    "R1107",
-                    "R1108",
-                    "R1116",
-                    "R1117",
-                    "R1149",
-                    "R1156",
-                    "R1189",
-                    "R1190",
-                ]
+            targets = [
+                "R1107",
+                "R1108",
+                "R1116",
+                "R1117",
+                "R1149",
+                "R1156",
+                "R1189",
+                "R1190",
             ]
             models = models.copy()
             models.remove("mcsym")
             metrics = metrics.copy()
-        for n_file in files:
-            in_df = os.path.join(in_path, n_file)
-            df = pd.read_csv(in_df, index_col=[0])
+        if target_means is None:
+            target_means = self.get_target_means(in_path, targets, metrics, models)
+        for target in targets:
             for model in models:
-                out = self.get_metrics_from_model(df, model, metrics)
-                for c_score, metric in zip(out, metrics):
-                    scores[model][metric].append(c_score)
+                for metric in metrics:
+                    scores[model][metric].append(target_means[target][model][metric])
         scores = self.get_mean_scores(scores)
         return scores
 
+    def get_targets(self, in_path: str) -> List[str]:
+        """
+        Return the names of the RNAs of a dataset, from the database if given.
+        """
+        if self.db_path is not None:
+            dataset = os.path.basename(os.path.normpath(in_path))
+            return ResultsDB(self.db_path).get_targets(dataset)
+        files = [x for x in os.listdir(in_path) if x.endswith(".csv")]
+        return [x.replace(".csv", "") for x in files]
+
+    def get_target_means(
+        self,
+        in_path: str,
+        targets: Optional[List[str]] = None,
+        metrics: List = SUB_METRICS,
+        models: List = ALL_MODELS,
+        dfs: Optional[Dict[str, pd.DataFrame]] = None,
+    ) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Return the mean of each metric per model for each RNA, from the
+        precomputed aggregates if available, else from the scores.
+        :param targets: RNAs to average, default to all the RNAs of the dataset
+        :param dfs: scores already read (one dataframe per RNA), to avoid reading
+            the .csv files again
+        :return: dictionary with the RNA, the model and the mean of each metric
+        """
+        if targets is None:
+            targets = list(dfs) if dfs is not None else self.get_targets(in_path)
+        if self.cube_dir is not None:
+            return self._get_metrics_from_cube(in_path, targets, metrics, models)
+        if dfs is None:
+            dfs = self._read_dfs(in_path, targets)
+        target_means = {}
+        for target in targets:
+            df = dfs[target].rename(columns=OLD_TO_NEW)
+            target_means[target] = {
+                model: dict(
+                    zip(metrics, self.get_metrics_from_model(df, model, metrics))
+                )
+                for model in models
+            }
+        return target_means
+
+    def _read_dfs(self, in_path: str, targets: List[str]) -> Dict[str, pd.DataFrame]:
+        """
+        Read the scores of the given RNAs, either from the .csv files or from
+        the database.
+        """
+        if self.db_path is not None:
+            dataset = os.path.basename(os.path.normpath(in_path))
+            return ResultsDB(self.db_path).read_dataset(dataset, targets)
+        return {
+            target: pd.read_csv(os.path.join(in_path, f"{target}.csv"), index_col=[0])
+            for target in targets
+        }
+
+    def _get_metrics_from_cube(
+        self, in_path: str, targets: List[str], metrics: List, models: List
+    ) -> Dict:
+        """
+        Return the mean of each metric per model for each RNA, from the
+        precomputed aggregates (same output as get_target_means).
+        """
+        dataset = os.path.basename(os.path.normpath(in_path))
+        cube = AggregateCube(self.cube_dir)
+        cube.update(dataset, in_path)
+        means = cube.get_mean_by_target(dataset, models, targets)
+        target_means: Dict = {target: {} for target in targets}
+        for model in models:
+            df = means[model].rename(columns=OLD_TO_NEW).reindex(
+                index=targets, columns=metrics
+            )
+            for target, row in df.iterrows():
+                target_means[target][model] = row.to_dict()
+        return target_means
+
     def get_mean_scores(self, scores: Dict):
         for model, values in scores.items():
             for metric_name, metric in values.items():
@@ -180,8 +296,7 @@ class VizPolar:
 
     def get_metrics_from_model(self, df: pd.DataFrame, model: str, metrics: List):
         names = [x for x in df.index if model in x]
-        df.rename(columns=OLD_TO_NEW, inplace=True)
-        df = df.loc[names].mean(axis=0)
+        df = df.rename(columns=OLD_TO_NEW).loc[names].mean(axis=0)
         output = []
         for metric in metrics:
             if metric in df:
@@ -0,0 +1,135 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Style of the axes shared by the figures of the paper
+PAPER_AXES = dict(
+    showgrid=True,
+    linecolor="black",
+    zeroline=False,
+    linewidth=1,
+    showline=True,
+    mirror=True,
+    gridwidth=1,
+    griddash="dot",
+)
+PAPER_FONT = dict(family="Computer Modern")
+
+
+def register_template(name: str, base: str, layout: Dict) -> str:
+    """
+    Register a named plotly template, built on top of an existing one.
+    The properties of the template are the default values of the figures that
+    use it: only the properties set explicitly by plotly (subplots, px) have to
+    be given again in the layout of the figure.
+    :param name: name of the new template
+    :param base: name of the template to start from (e.g. "plotly")
+    :param layout: properties of the layout; "xaxis" and "yaxis" apply to all
+        the axes of the figure
+    :return: the name of the template
+    """
+    template = go.layout.Template(pio.templates[base])
+    template.layout.update(layout)
+    pio.templates[name] = template
+    return name
+
+
+HEATMAP_TEMPLATE = register_template(
+    "rnart_heatmap",
+    "plotly",
+    dict(
+        xaxis=dict(**PAPER_AXES, gridcolor="grey", tickson="boundaries"),
+        yaxis=dict(**PAPER_AXES, gridcolor="grey", tickson="boundaries"),
+        plot_bgcolor="white",
+        font=dict(**PAPER_FONT, size=10),
+    ),
+)
+BOX_TEMPLATE = register_template(
+    "rnart_box",
+    "plotly",
+    dict(
+        xaxis=dict(**PAPER_AXES, gridcolor="#d6d6d6", tickangle=45, visible=True),
+        yaxis=dict(**PAPER_AXES, gridcolor="#d6d6d6"),
+        plot_bgcolor="white",
+        font=dict(**PAPER_FONT, size=18),
+        legend=dict(bgcolor="#f3f3f3", bordercolor="Black", borderwidth=1),
+    ),
+)
+POLAR_TEMPLATE = register_template(
+    "rnart_polar",
+    "plotly_white",
+    dict(
+        polar=dict(
+            radialaxis=dict(
+                showline=False,
+                showgrid=True,
+                linewidth=0.5,
+                linecolor="black",
+                gridcolor="black",
+                gridwidth=0.5,
+                showticklabels=False,
+                tickfont_size=20,
+            ),
+            angularaxis=dict(
+                linewidth=0.5,
+                visible=True,
+                linecolor="black",
+                showline=True,
+                gridcolor="black",
+            ),
+            bgcolor="white",
+        ),
+        legend=dict(
+            orientation="v",
+            bgcolor="white",
+            bordercolor="Black",
+            borderwidth=1,
+            font=dict(size=20),
+        ),
+        font_size=28,
+    ),
+)
+
+
+def get_axes_layout(
+    fig: Any, axes: Dict[Tuple[int, int], Tuple[Optional[Dict], Optional[Dict]]]
+) -> Dict:
+    """
+    Return the layout entries of the axes of some subplots, to be set with the
+    rest of the layout in a single update.
+    :param fig: figure with subplots (make_subplots or px with facets)
+    :param axes: dictionary with the (row, col) of the subplots and the
+        properties of their x and y axes (None to leave an axis unchanged)
+    :return: dictionary with the axis names (xaxis2, ...) and their properties
+    """
+    layout = {}
+    for (row, col), (xaxis, yaxis) in axes.items():
+        subplot = fig.get_subplot(row, col)
+        for axis, params in [(subplot.xaxis, xaxis), (subplot.yaxis, yaxis)]:
+            if params is not None:
+                layout[axis.plotly_name] = params
+    return layout
+
+
+def get_annotations(fig: Any, replace: Optional[Dict] = None, **params) -> List:
+    """
+    Return the annotations of a figure (subplot titles) with new properties.
+    :param replace: strings to replace in the texts (e.g. {"Metric_name=": ""})
+    :param params: properties to set on all the annotations
+    """
+    annotations = []
+    for annotation in fig.layout.annotations:
+        annotation = annotation.to_plotly_json()
+        for old, new in (replace or {}).items():
+            annotation["text"] = annotation["text"].replace(old, new)
+        annotations.append({**annotation, **params})
+    return annotations
+
+
+def apply_style(fig: Any, template: str, layout: Dict) -> Any:
+    """
+    Set the template and the layout of a figure in a single update.
+    """
+    fig.update_layout(template=template, **layout)
+    return fig
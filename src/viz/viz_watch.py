@@ -0,0 +1,179 @@
+import os
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Set
+
+import pandas as pd
+
+from src.viz.enum import OLD_TO_NEW
+from src.viz.viz_abstract import VizAbstract
+from src.viz.viz_box import VizBox
+from src.viz.viz_cli import VizCLI
+from src.viz.viz_heat import VizHeat
+from src.viz.viz_polar import VizPolar
+
+
+class VizWatch:
+    def __init__(
+        self, benchmarks: List[str], interval: float = 2, debounce: float = 10
+    ):
+        """
+        Watch the folders of .csv files and refresh the visualisations as new
+        scores are computed.
+        Only the rows of the changed .csv files are updated in the scores, and
+        only the outputs of the changed benchmarks are drawn again.
+        :param benchmarks: names of the benchmarks, in docker_data/output
+        :param interval: seconds between two checks of the folders
+        :param debounce: seconds without change in a benchmark before refreshing it,
+            to draw the outputs once when several .csv files are written in a row
+        """
+        self.benchmarks = benchmarks
+        self.interval = interval
+        self.debounce = debounce
+        self.csv_folders = {
+            name: os.path.join("docker_data", "output", name) for name in benchmarks
+        }
+        ingested = VizCLI.ingest(benchmarks, n_jobs=os.cpu_count() or 1)
+        self.scores = {name: output[0] for name, output in ingested.items()}
+        self.target_means = {name: output[1] for name, output in ingested.items()}
+        self.mean_scores = {
+            name: VizPolar({}).get_mean_metrics(
+                self.csv_folders[name], target_means=self.target_means[name]
+            )
+            for name in benchmarks
+        }
+        self.snapshots = {name: self._snapshot(name) for name in benchmarks}
+        self.changes: Dict[str, Set[str]] = {name: set() for name in benchmarks}
+        self.last_change: Dict[str, float] = {}
+
+    def _snapshot(self, benchmark: str) -> Dict[str, int]:
+        """
+        Return the modification time of each .csv file of a benchmark.
+        """
+        csv_folder = self.csv_folders[benchmark]
+        return {
+            x: os.stat(os.path.join(csv_folder, x)).st_mtime_ns
+            for x in os.listdir(csv_folder)
+            if x.endswith(".csv")
+        }
+
+    def poll(self) -> List[str]:
+        """
+        Check the folders for added, changed or removed .csv files.
+        :return: the benchmarks that are ready to be refreshed
+        """
+        now = time.monotonic()
+        for benchmark in self.benchmarks:
+            snapshot = self._snapshot(benchmark)
+            old_snapshot = self.snapshots[benchmark]
+            changed = {
+                x
+                for x in set(snapshot) | set(old_snapshot)
+                if snapshot.get(x) != old_snapshot.get(x)
+            }
+            if changed:
+                self.changes[benchmark] |= changed
+                self.last_change[benchmark] = now
+                self.snapshots[benchmark] = snapshot
+        return [
+            benchmark
+            for benchmark, last_change in self.last_change.items()
+            if now - last_change >= self.debounce
+        ]
+
+    def update_scores(self, benchmark: str) -> bool:
+        """
+        Update the rows of the changed .csv files in the scores of a benchmark,
+        and the means of these RNAs for the polar plots.
+        :return: False if a file could not be read (e.g. still being written)
+        """
+        csv_folder = self.csv_folders[benchmark]
+        viz = VizAbstract(csv_folder, benchmark, scores_df=self.scores[benchmark])
+        dfs = {}
+        for csv_file in self.changes[benchmark]:
+            csv_path = os.path.join(csv_folder, csv_file)
+            if not os.path.exists(csv_path):
+                continue
+            try:
+                df = pd.read_csv(csv_path, index_col=[0])
+            except (pd.errors.EmptyDataError, pd.errors.ParserError):
+                return False
+            dfs[csv_file.replace(".csv", "")] = df
+        rna_names = [
+            OLD_TO_NEW.get(x.replace(".csv", ""), x.replace(".csv", ""))
+            for x in self.changes[benchmark]
+        ]
+        scores_df = self.scores[benchmark]
+        scores_df = scores_df[~scores_df["RNA_name"].isin(rna_names)]
+        if dfs:
+            scores_df = pd.concat([scores_df, viz.get_df_clean_from_dfs(dfs)])
+        self.scores[benchmark] = scores_df.reset_index(drop=True)
+        # Same for the means of the polar plots: only the changed RNAs are averaged
+        viz_polar = VizPolar({})
+        target_means = self.target_means[benchmark]
+        for csv_file in self.changes[benchmark]:
+            target_means.pop(csv_file.replace(".csv", ""), None)
+        target_means.update(viz_polar.get_target_means(csv_folder, dfs=dfs))
+        self.mean_scores[benchmark] = viz_polar.get_mean_metrics(
+            csv_folder, target_means=target_means
+        )
+        return True
+
+    def refresh(self, benchmark: str) -> bool:
+        """
+        Update the scores of a benchmark and draw again its box plot, heatmap and
+        summary table.
+        :return: whether the benchmark has been refreshed
+        """
+        if not self.update_scores(benchmark):
+            return False
+        print(f"{benchmark}: {len(self.changes[benchmark])} files changed, refreshing")
+        self.changes[benchmark] = set()
+        del self.last_change[benchmark]
+        self._run_output(self._run_box, benchmark)
+        self._run_output(self._run_heat, benchmark)
+        return True
+
+    def _run_output(self, output: Callable, *args):
+        try:
+            output(*args)
+        except Exception:
+            # Keep watching: a benchmark can be incomplete during the scoring
+            traceback.print_exc()
+
+    def _run_box(self, benchmark: str):
+        csv_folder, scores_df = self.csv_folders[benchmark], self.scores[benchmark]
+        viz_box = VizBox(csv_folder, benchmark, scores_df=scores_df)
+        viz_box.box_plot_by_method()
+
+    def _run_heat(self, benchmark: str):
+        csv_folder, scores_df = self.csv_folders[benchmark], self.scores[benchmark]
+        viz_heat = VizHeat(csv_folder, benchmark, scores_df=scores_df)
+        viz_heat.summary_all_table()
+        viz_heat.ranking_tables()
+        viz_heat.plot_heatmaps()
+
+    def _run_polar(self):
+        VizCLI.run_all_benchmark(self.benchmarks, mean_scores=self.mean_scores)
+
+    def watch(self, max_iter: Optional[int] = None):
+        """
+        Watch the folders until interrupted (or for max_iter checks).
+        """
+        n_iter = 0
+        while max_iter is None or n_iter < max_iter:
+            refreshed = [x for x in self.poll() if self.refresh(x)]
+            if refreshed:
+                # The polar plots gather all the benchmarks: draw them once
+                self._run_output(self._run_polar)
+            n_iter += 1
+            time.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    benchmarks = ["CASP_RNA", "RNA_PUZZLES", "RNASOLO"]
+    viz_watch = VizWatch(benchmarks)
+    try:
+        viz_watch.watch()
+    except KeyboardInterrupt:
+        pass
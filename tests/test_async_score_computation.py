@@ -0,0 +1,51 @@
+import os
+
+from src.benchmark.async_score_computation import AsyncScoreComputation
+
+FAKE_DOCKER = """#!/usr/bin/env python3
+import os, sys
+if sys.argv[1] == "rm":
+    with open("removed.txt", "a") as file:
+        file.write(" ".join(sys.argv[3:]) + "\\n")
+    sys.exit(0)
+challenge = os.path.basename(sys.argv[sys.argv.index("--pred_path") + 1])
+if challenge == "A":
+    # Progress bar redrawn without newline
+    for step in range(20000):
+        sys.stdout.write(f"\\rprogress {step}")
+    sys.exit(0)
+sys.exit(1 if challenge == "B" else 0)
+"""
+
+
+def get_score_computation(tmp_path, monkeypatch) -> AsyncScoreComputation:
+    docker = tmp_path / "bin" / "docker"
+    docker.parent.mkdir()
+    docker.write_text(FAKE_DOCKER)
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{docker.parent}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.chdir(tmp_path)
+    for challenge in ["A", "B", "C", "D"]:
+        (tmp_path / "NATIVE").mkdir(exist_ok=True)
+        (tmp_path / "NATIVE" / f"{challenge}.pdb").write_text("")
+        (tmp_path / "PREDS" / challenge).mkdir(parents=True)
+    return AsyncScoreComputation("NATIVE", "PREDS", "output", n_jobs=2)
+
+
+def test_long_output_and_failed_jobs_do_not_stop_the_run(tmp_path, monkeypatch):
+    score_computation = get_score_computation(tmp_path, monkeypatch)
+    get_command = score_computation.get_command
+
+    def get_command_or_missing(*paths, **kwargs):
+        # The client of D can not be started
+        if paths[1].endswith("D"):
+            return [str(tmp_path / "missing_docker")]
+        return get_command(*paths, **kwargs)
+
+    monkeypatch.setattr(score_computation, "get_command", get_command_or_missing)
+    score_computation.run_benchmark()
+    status = {os.path.basename(k): v for k, v in score_computation.status.items()}
+    assert status == dict(A="done", B="failed", C="done", D="failed")
+    log_path = os.path.join("docker_data", "logs", "A_docker.log")
+    assert os.path.getsize(log_path) > 2**16
+    assert score_computation.containers == {}
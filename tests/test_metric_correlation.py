@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.metric_correlation import MetricCorrelation
+
+
+def get_dfs(n_targets: int = 4, n_decoys: int = 30) -> dict:
+    """
+    Random scores with metrics missing on different decoys, and ties.
+    """
+    rng = np.random.default_rng(0)
+    dfs = {}
+    for target in range(n_targets):
+        base = rng.normal(size=n_decoys)
+        df = pd.DataFrame(
+            {
+                "RMSD": base + rng.normal(scale=0.5, size=n_decoys),
+                "TM-score": -base + rng.normal(scale=0.5, size=n_decoys),
+                "MCQ": np.round(base + rng.normal(size=n_decoys)),
+                "CAD": rng.normal(size=n_decoys),
+            },
+            index=[f"model{x}_t{target}" for x in range(n_decoys)],
+        )
+        df.loc[df.index[rng.random(n_decoys) < 0.2], "TM-score"] = np.nan
+        df.loc[df.index[rng.random(n_decoys) < 0.3], "MCQ"] = np.nan
+        df.loc[df.index[: n_decoys // 3], "CAD"] = np.nan
+        dfs[f"t{target}"] = df
+    return dfs
+
+
+def test_correlations_match_pandas_with_missing_values():
+    dfs = get_dfs()
+    df = pd.concat(dfs.values())
+    metric_correlation = MetricCorrelation(dfs, chunk_size=7)
+    pd.testing.assert_frame_equal(
+        metric_correlation.spearman(), df.corr("spearman"), check_names=False
+    )
+    pd.testing.assert_frame_equal(
+        metric_correlation.pearson(), df.corr("pearson"), check_names=False
+    )
+
+
+def test_agreement_matches_pairs_of_decoys():
+    dfs = get_dfs(n_decoys=12)
+    for df in dfs.values():
+        df["UNKNOWN"] = np.arange(len(df), dtype=float)
+    agreement = MetricCorrelation(dfs, chunk_size=5).agreement()
+    directions = {"RMSD": -1, "TM-score": 1, "MCQ": -1, "CAD": 1}
+    for metric_1, direction_1 in directions.items():
+        for metric_2, direction_2 in directions.items():
+            concordant = discordant = 0
+            for df in dfs.values():
+                values_1 = df[metric_1].to_numpy() * direction_1
+                values_2 = df[metric_2].to_numpy() * direction_2
+                for i in range(len(df)):
+                    for j in range(i + 1, len(df)):
+                        sign = np.sign(values_1[i] - values_1[j]) * np.sign(
+                            values_2[i] - values_2[j]
+                        )
+                        concordant += sign == 1
+                        discordant += sign == -1
+            expected = concordant / (concordant + discordant)
+            assert np.isclose(agreement.loc[metric_1, metric_2], expected)
+    # RMSD is lower is better and TM-score higher is better
+    assert agreement.loc["RMSD", "TM-score"] > 0.5
+    # The direction of the metric is unknown
+    assert agreement["UNKNOWN"].isna().all()
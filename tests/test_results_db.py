@@ -0,0 +1,59 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from src.utils.results_db import ResultsDB
+
+
+def write_csv(csv_folder, target: str) -> pd.DataFrame:
+    # Metrics not sorted by name, as in the .csv files of RNAdvisor
+    models = ["rnajp", "epRNA", "3drna"]
+    df = pd.DataFrame(
+        {
+            "RMSD": [1.5, 2.0, 3.2],
+            "INF-ALL": [0.8, np.nan, 0.5],
+            "CAD": [0.3, 0.2, 0.1],
+        },
+        index=[f"normalized_{model}_{target}.pdb" for model in models],
+    )
+    df.to_csv(csv_folder / f"{target}.csv")
+    return pd.read_csv(csv_folder / f"{target}.csv", index_col=[0])
+
+
+def test_read_dataset_keeps_the_format_of_the_csv_files(tmp_path):
+    csv_folder = tmp_path / "CASP_RNA"
+    csv_folder.mkdir()
+    dfs = {target: write_csv(csv_folder, target) for target in ["R1107", "R1108"]}
+    results_db = ResultsDB(str(tmp_path / "scores.db"))
+    assert results_db.import_folder("CASP_RNA", str(csv_folder)) == ["R1107", "R1108"]
+    read_dfs = results_db.read_dataset("CASP_RNA")
+    assert list(read_dfs) == list(dfs)
+    for target, df in dfs.items():
+        pd.testing.assert_frame_equal(read_dfs[target], df)
+
+
+def test_previous_database_is_imported_again(tmp_path):
+    csv_folder = tmp_path / "CASP_RNA"
+    csv_folder.mkdir()
+    df = write_csv(csv_folder, "R1107")
+    db_path = str(tmp_path / "scores.db")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        # Tables of a database without the position of the metrics
+        conn.executescript(
+            "CREATE TABLE scores (dataset TEXT NOT NULL, target TEXT NOT NULL, "
+            "model TEXT NOT NULL, decoy TEXT NOT NULL, metric TEXT NOT NULL, "
+            "value REAL, position INTEGER NOT NULL, "
+            "PRIMARY KEY (dataset, target, model, decoy, metric));"
+            "CREATE TABLE sources (dataset TEXT NOT NULL, target TEXT NOT NULL, "
+            "mtime REAL NOT NULL, PRIMARY KEY (dataset, target));"
+        )
+        conn.execute(
+            "INSERT INTO sources VALUES (?, ?, ?)",
+            ("CASP_RNA", "R1107", (csv_folder / "R1107.csv").stat().st_mtime),
+        )
+    conn.close()
+    results_db = ResultsDB(db_path)
+    assert results_db.import_folder("CASP_RNA", str(csv_folder)) == ["R1107"]
+    pd.testing.assert_frame_equal(results_db.read_dataset("CASP_RNA")["R1107"], df)
@@ -0,0 +1,96 @@
+import json
+import multiprocessing
+import os
+import signal
+import time
+
+from src.benchmark.work_queue import DistributedScoreComputation, WorkQueue
+
+N_JOBS = 60
+
+
+def run_job(index: int, out_dir: str) -> bool:
+    time.sleep(0.05)
+    with open(os.path.join(out_dir, f"{index}.{os.getpid()}"), "w") as file:
+        file.write("done")
+    return True
+
+
+def run_worker(queue_dir: str, wait: bool = False):
+    queue = WorkQueue(queue_dir, timeout=1, heartbeat=0.1)
+    queue.work(run_job, wait=wait, poll=0.1)
+
+
+def test_workers_complete_all_jobs_when_some_are_killed(tmp_path):
+    queue_dir, out_dir = str(tmp_path / "queue"), tmp_path / "out"
+    out_dir.mkdir()
+    queue = WorkQueue(queue_dir, timeout=1, heartbeat=0.1)
+    for index in range(N_JOBS):
+        assert queue.submit(f"job{index}", dict(index=index, out_dir=str(out_dir)))
+    # A job is only submitted once
+    assert not queue.submit("job0", dict(index=0, out_dir=str(out_dir)))
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(queue_dir,))
+        for _ in range(6)
+    ]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.3)
+    # Kill some workers in the middle of their jobs
+    for worker in workers[:3]:
+        os.kill(worker.pid, signal.SIGKILL)
+    for worker in workers:
+        worker.join(timeout=60)
+    # The jobs of the killed workers are taken over once their heartbeat stops
+    run_worker(queue_dir, wait=True)
+    assert queue.summary() == dict(pending=0, claimed=0, done=N_JOBS, failed=0)
+    done = {int(x.split(".")[0]) for x in os.listdir(out_dir)}
+    assert done == set(range(N_JOBS))
+
+
+def test_worker_runs_docker_without_terminal(tmp_path, monkeypatch):
+    # Fake docker that records its arguments
+    args_path = tmp_path / "args.json"
+    docker = tmp_path / "docker"
+    docker.write_text(
+        "#!/usr/bin/env python3\n"
+        "import json, sys\n"
+        f"json.dump(sys.argv[1:], open({str(args_path)!r}, 'w'))\n"
+    )
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    score_computation = DistributedScoreComputation(
+        "NATIVE", "PREDS", str(tmp_path / "output"), queue_dir=str(tmp_path / "queue")
+    )
+    assert score_computation._run_job(
+        native_path="NATIVE/R1107.pdb",
+        pred_path="PREDS/R1107",
+        output_path="output/R1107.csv",
+        log_path="logs/R1107.log",
+        time_path="time/R1107_time.csv",
+    )
+    args = json.loads(args_path.read_text())
+    assert args[0] == "run" and "-it" not in args
+    assert "--rm" in args and "--native_path" in args
+
+
+def fail_first(index: int, out_dir: str) -> bool:
+    marker = os.path.join(out_dir, f"{index}.failed")
+    if os.path.exists(marker):
+        return True
+    open(marker, "w").close()
+    return False
+
+
+def test_failed_jobs_are_submitted_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    job = dict(index=0, out_dir=str(tmp_path))
+    assert queue.submit("job0", job)
+    queue.work(fail_first)
+    assert queue.get_state("job0") == "failed"
+    assert queue.submit("job0", job)
+    assert queue.get_state("job0") == "pending"
+    queue.work(fail_first)
+    assert queue.summary() == dict(pending=0, claimed=0, done=1, failed=0)
+    # A done job is not submitted again
+    assert not queue.submit("job0", job)